@@ -4,11 +4,79 @@ Analysis script for hybrid A* + CSP experiment results.
 
 import os
 import json
+from concurrent.futures import ThreadPoolExecutor
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
+# Metrics averaged per group in the technique comparisons
+COMPARISON_METRICS = {
+    "Success": "mean",
+    "Iterations": "mean",
+    "SearchTime": "mean",
+    "TotalTime": "mean",
+    "MaxFlights": "mean",
+    "MaxParts": "mean"
+}
+
+# Columns used from the hybrid summary and their types, so read_csv parses
+# only what the analysis needs and skips type inference
+SUMMARY_DTYPES = {
+    "Experiment": "category",
+    "Weight": "float64",
+    "ForwardChecking": bool,
+    "RandomRestarts": bool,
+    "Success": bool,
+    "Iterations": "int32",
+    "PlanLength": "int32",
+    "SearchTime": "float64",
+    "TotalTime": "float64",
+    "MaxFlights": "int16",
+    "MaxParts": "int16"
+}
+
+# The original (improved A*) summary has no technique or progress columns
+ORIGINAL_SUMMARY_DTYPES = {
+    column: dtype for column, dtype in SUMMARY_DTYPES.items()
+    if column not in ("Weight", "ForwardChecking", "RandomRestarts", "MaxFlights", "MaxParts")
+}
+
+def read_summary(summary_file, dtypes):
+    """
+    Read the given columns of a summary CSV with explicit types.
+    
+    Columns missing from the file are skipped, since summaries of runs
+    from before the weight sweep have no Weight column.
+    """
+    return pd.read_csv(summary_file, usecols=lambda column: column in dtypes, dtype=dtypes)
+
+def load_metadata(metadata_file):
+    """Load an experiment's metadata JSON, or return None if it is missing."""
+    if not os.path.exists(metadata_file):
+        return None
+    with open(metadata_file, "r") as mf:
+        return json.load(mf)
+
+# Metrics drawn as panels of the per-experiment comparison figure
+PLOT_METRICS = ["Success", "MaxFlights", "MaxParts", "TotalTime"]
+
+def compare_by(summary, column):
+    """
+    Average the experiment metrics for each value of a summary column.
+    
+    Only built-in aggregations are used so pandas stays on its fast
+    groupby path, without sorting the groups or expanding unobserved
+    categories; only the small result is sorted. The mean plan length is
+    taken over successful runs (PlanLength > 0) only and is 0 for groups
+    without any.
+    """
+    comparison = summary.groupby(column, sort=False, observed=True).agg(COMPARISON_METRICS).sort_index()
+    successful = summary[summary["PlanLength"] > 0]
+    plan_length = successful.groupby(column, sort=False, observed=True)["PlanLength"].mean()
+    comparison["PlanLength"] = plan_length.reindex(comparison.index).fillna(0)
+    return comparison
+
 def analyze_hybrid_results():
     # Get the latest results directory
     results_dir = "hybrid_experiment_results"
@@ -26,7 +94,7 @@ def analyze_hybrid_results():
     
     # Read the summary file
     summary_file = os.path.join(latest_run, "summary.csv")
-    summary = pd.read_csv(summary_file)
+    summary = read_summary(summary_file, SUMMARY_DTYPES)
     
     # Calculate success rate
     success_rate = summary["Success"].mean() * 100
@@ -40,33 +108,18 @@ def analyze_hybrid_results():
     report_dir = os.path.join(latest_run, "analysis")
     os.makedirs(report_dir, exist_ok=True)
     
-    # Plot comparison of success rates
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x="Experiment", y="Success", data=summary)
-    plt.title("Success Rate by Experiment")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-    plt.savefig(os.path.join(report_dir, "success_comparison.png"))
-    
-    # Plot max flights and max parts comparison
-    plt.figure(figsize=(10, 6))
-    ax = sns.barplot(x="Experiment", y="MaxFlights", data=summary, color="blue", label="Max Flights")
-    ax2 = ax.twinx()
-    sns.barplot(x="Experiment", y="MaxParts", data=summary, color="green", alpha=0.5, ax=ax2, label="Max Parts")
-    plt.title("Progress by Experiment")
-    plt.xticks(rotation=45, ha="right")
-    ax.legend(loc='upper left')
-    ax2.legend(loc='upper right')
-    plt.tight_layout()
-    plt.savefig(os.path.join(report_dir, "progress_comparison.png"))
-    
-    # Plot search time comparison
-    plt.figure(figsize=(10, 6))
-    sns.barplot(x="Experiment", y="TotalTime", data=summary)
-    plt.title("Total Execution Time by Experiment")
-    plt.xticks(rotation=45, ha="right")
-    plt.tight_layout()
-    plt.savefig(os.path.join(report_dir, "time_comparison.png"))
+    # Plot success rate, progress and execution time as panels of one figure;
+    # the metric columns are melted into long form once and drawn in one pass
+    metrics = summary.melt(id_vars=["Experiment"], value_vars=PLOT_METRICS,
+                           var_name="Metric", value_name="Value")
+    metrics["Value"] = metrics["Value"].astype(float)
+    g = sns.catplot(data=metrics, x="Experiment", y="Value", col="Metric", kind="bar",
+                    sharey=False, col_wrap=2, height=4, aspect=1.5)
+    g.set_titles("{col_name} by Experiment")
+    g.tick_params(axis="x", labelrotation=45)
+    g.tight_layout()
+    g.savefig(os.path.join(report_dir, "metrics_comparison.png"))
+    plt.close('all')
     
     # Plot plan length (only for successful experiments)
     successful = summary[summary["Success"] == True]
@@ -77,6 +130,7 @@ def analyze_hybrid_results():
         plt.xticks(rotation=45, ha="right")
         plt.tight_layout()
         plt.savefig(os.path.join(report_dir, "plan_length_comparison.png"))
+        plt.close('all')
     
     # Compare hybrid with original approach
     # Check if original results exist
@@ -89,29 +143,35 @@ def analyze_hybrid_results():
         original_summary_file = os.path.join(latest_original_run, "summary.csv")
         
         if os.path.exists(original_summary_file):
-            original_summary = pd.read_csv(original_summary_file)
+            original_summary = read_summary(original_summary_file, ORIGINAL_SUMMARY_DTYPES)
+            
+            # Give both summaries the same Experiment categories so concat
+            # keeps the categorical dtype instead of recoding the column
+            experiments = original_summary["Experiment"].cat.categories.union(
+                summary["Experiment"].cat.categories, sort=False)
+            original_summary["Experiment"] = original_summary["Experiment"].cat.set_categories(experiments)
+            summary["Experiment"] = summary["Experiment"].cat.set_categories(experiments)
             
             # Add approach type for plotting
-            original_summary["Approach"] = "Original"
-            summary["Approach"] = "Hybrid"
+            approaches = pd.CategoricalDtype(["Original", "Hybrid"])
+            original_summary["Approach"] = pd.Series("Original", index=original_summary.index, dtype=approaches)
+            summary["Approach"] = pd.Series("Hybrid", index=summary.index, dtype=approaches)
             
-            # Combine dataframes
+            # Combine dataframes once and melt the progress metrics so both
+            # comparisons are drawn as panels of a single figure
             combined = pd.concat([original_summary, summary])
+            progress = combined.melt(id_vars=["Experiment", "Approach"],
+                                     value_vars=["MaxFlights", "MaxParts"],
+                                     var_name="Metric", value_name="Value")
             
             # Plot comparison
-            plt.figure(figsize=(12, 8))
-            ax = sns.barplot(x="Experiment", y="MaxFlights", hue="Approach", data=combined)
-            plt.title("Maximum Flights Progress: Original vs Hybrid")
-            plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            plt.savefig(os.path.join(report_dir, "original_vs_hybrid_flights.png"))
-            
-            plt.figure(figsize=(12, 8))
-            ax = sns.barplot(x="Experiment", y="MaxParts", hue="Approach", data=combined)
-            plt.title("Maximum Parts Progress: Original vs Hybrid")
-            plt.xticks(rotation=45, ha="right")
-            plt.tight_layout()
-            plt.savefig(os.path.join(report_dir, "original_vs_hybrid_parts.png"))
+            g = sns.catplot(data=progress, x="Experiment", y="Value", hue="Approach", col="Metric",
+                            kind="bar", sharey=False, height=6, aspect=1.2)
+            g.set_titles("{col_name} Progress: Original vs Hybrid")
+            g.tick_params(axis="x", labelrotation=45)
+            g.tight_layout()
+            g.savefig(os.path.join(report_dir, "original_vs_hybrid_progress.png"))
+            plt.close('all')
     
     # Create detailed analysis report
     report_file = os.path.join(report_dir, "hybrid_analysis_report.txt")
@@ -129,57 +189,55 @@ def analyze_hybrid_results():
         
         # Compare techniques
         f.write("Forward Checking Comparison:\n")
-        fc_comparison = summary.groupby("ForwardChecking").agg({
-            "Success": "mean",
-            "Iterations": "mean",
-            "SearchTime": "mean",
-            "TotalTime": "mean",
-            "MaxFlights": "mean",
-            "MaxParts": "mean",
-            "PlanLength": lambda x: x[x > 0].mean() if any(x > 0) else 0
-        })
+        fc_comparison = compare_by(summary, "ForwardChecking")
         f.write(fc_comparison.to_string())
         f.write("\n\n")
         
         f.write("Random Restarts Comparison:\n")
-        rr_comparison = summary.groupby("RandomRestarts").agg({
-            "Success": "mean",
-            "Iterations": "mean",
-            "SearchTime": "mean",
-            "TotalTime": "mean",
-            "MaxFlights": "mean",
-            "MaxParts": "mean",
-            "PlanLength": lambda x: x[x > 0].mean() if any(x > 0) else 0
-        })
+        rr_comparison = compare_by(summary, "RandomRestarts")
         f.write(rr_comparison.to_string())
         f.write("\n\n")
         
+        if "Weight" in summary.columns:
+            f.write("Heuristic Weight Comparison:\n")
+            weight_comparison = compare_by(summary, "Weight")
+            f.write(weight_comparison.to_string())
+            f.write("\n\n")
+        
         # Detailed analysis for each experiment
         f.write("Detailed Experiment Analysis:\n")
-        for _, row in summary.iterrows():
-            exp_name = row["Experiment"]
-            exp_dir = os.path.join(latest_run, exp_name.replace(" ", "_"))
-            metadata_file = os.path.join(exp_dir, "metadata.json")
+        exp_names = [row.Experiment for row in summary.itertuples(index=False)]
+        metadata_files = [os.path.join(latest_run, exp_name.replace(" ", "_"), "metadata.json")
+                          for exp_name in exp_names]
+        
+        # Reading the metadata files is I/O bound, so load them concurrently
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            metadatas = list(executor.map(load_metadata, metadata_files))
+        
+        # Build the section in memory and write it in one call
+        lines = []
+        for exp_name, metadata in zip(exp_names, metadatas):
+            if metadata is None:
+                continue
+            
+            lines.append(f"\n{exp_name}:\n")
+            lines.append(f"  Heuristic: {metadata['heuristic']}\n")
+            if 'weight' in metadata:
+                lines.append(f"  Heuristic Weight: {metadata['weight']}\n")
+            lines.append(f"  Prioritize Actions: {metadata['prioritize_actions']}\n")
+            lines.append(f"  Forward Checking: {metadata['use_forward_checking']}\n")
+            lines.append(f"  Random Restarts: {metadata['use_random_restarts']}\n")
+            lines.append(f"  Success: {metadata['success']}\n")
+            lines.append(f"  Search Time: {metadata['search_time']:.2f} seconds\n")
+            lines.append(f"  Total Time: {metadata['total_time']:.2f} seconds\n")
+            lines.append(f"  Maximum Flights Reached: {metadata['max_flights_reached']}/6\n")
+            lines.append(f"  Maximum Parts Produced: {metadata['max_parts_produced']}/13\n")
             
-            if os.path.exists(metadata_file):
-                with open(metadata_file, "r") as mf:
-                    metadata = json.load(mf)
-                
-                f.write(f"\n{exp_name}:\n")
-                f.write(f"  Heuristic: {metadata['heuristic']}\n")
-                f.write(f"  Prioritize Actions: {metadata['prioritize_actions']}\n")
-                f.write(f"  Forward Checking: {metadata['use_forward_checking']}\n")
-                f.write(f"  Random Restarts: {metadata['use_random_restarts']}\n")
-                f.write(f"  Success: {metadata['success']}\n")
-                f.write(f"  Search Time: {metadata['search_time']:.2f} seconds\n")
-                f.write(f"  Total Time: {metadata['total_time']:.2f} seconds\n")
-                f.write(f"  Maximum Flights Reached: {metadata['max_flights_reached']}/6\n")
-                f.write(f"  Maximum Parts Produced: {metadata['max_parts_produced']}/13\n")
-                
-                if metadata['success']:
-                    f.write(f"  Plan Length: {metadata['plan_length']}\n")
-                else:
-                    f.write("  No plan found\n")
+            if metadata['success']:
+                lines.append(f"  Plan Length: {metadata['plan_length']}\n")
+            else:
+                lines.append("  No plan found\n")
+        f.write("".join(lines))
         
         # Insights and recommendations
         f.write("\n\nInsights and Recommendations:\n")
@@ -1,66 +1,64 @@
 import heapq
+from array import array
 from collections import defaultdict
+from itertools import chain
 import time
 from beluga_heuristic import heuristic
+from beluga_instance import get_instance_cache
 from beluga_goal import is_goal_state, check_goal_progress
 from beluga_actions import MoveJigBetweenRacks, LoadJigToBeluga, UnloadJigFromBeluga, SendJigToProduction, ReturnEmptyJigFromFactory, ProcessNextFlight
 
-class PriorityQueue:
-    """A priority queue implementation for the A* search."""
-    
-    def __init__(self):
-        self.elements = []
-        self.entry_count = 0  # Used to break ties consistently
-    
-    def is_empty(self):
-        return len(self.elements) == 0
-    
-    def put(self, item, priority):
-        # Add entry_count to break ties and ensure FIFO behavior for equal priorities
-        heapq.heappush(self.elements, (priority, self.entry_count, item))
-        self.entry_count += 1
-    
-    def get(self):
-        # Return the item, discarding priority and entry_count
-        return heapq.heappop(self.elements)[2]
+# Open set entries are packed into a single int as
+# (scaled priority, entry count, state id), from the most significant bits down
+ID_BITS = 32
+ID_MASK = (1 << ID_BITS) - 1
+# Priorities are stored in thousandths, which is exact for the heuristics'
+# half-unit weights
+PRIORITY_SCALE = 1000
 
-def get_all_possible_actions(state, instance_data, prioritize_goals=True):
+def build_search_context(instance_data):
     """
-    Generate all possible actions from the current state.
+    Precompute instance lookups that stay constant for a whole search.
     
     Args:
-        state: Current BelugaState
         instance_data: Problem instance data
-        prioritize_goals: Whether to prioritize actions that directly 
-                         contribute to goal conditions
     
     Returns:
-        List of possible actions, ordered by priority if prioritize_goals is True
+        Dict with the production schedule as a set, the number of flights
+        and the rack IDs in instance order
     """
-    # First, collect all possible actions
-    all_actions = []
+    cache = get_instance_cache(instance_data)
+    return {
+        'production_schedule_set': cache.production_schedule_set,
+        'num_flights': cache.num_flights,
+        'rack_ids': tuple(rack.get('name') for rack in instance_data.get('racks', []))
+    }
+
+def _generate_move_actions(state, instance_data, context):
+    """Yield valid MoveJigBetweenRacks actions for the jigs at rack edges."""
+    # Free space is computed once per rack, so each candidate move is a single
+    # size comparison instead of a full is_valid_action occupancy scan; edge
+    # jigs are valid sources by construction
+    rack_ids = context['rack_ids']
+    free_space = {rack_id: state.get_rack_free_space(rack_id, instance_data) for rack_id in rack_ids}
     
-    # 1. Generate MoveJigBetweenRacks actions
     for from_rack_id, jigs in state.rack_jigs.items():
         if not jigs:
             continue
         
-        # Check jigs at the edges
-        for jig_id in [jigs[0], jigs[-1]] if len(jigs) > 0 else []:
-            if jig_id not in jigs:
-                continue  # Skip if jig not found (shouldn't happen)
+        # Check jigs at the edges (a single jig is both edges, so only once)
+        edge_jigs = (jigs[0],) if len(jigs) == 1 else (jigs[0], jigs[-1])
+        for jig_id in edge_jigs:
+            jig_size = state.get_jig_size(jig_id, instance_data)
             
-            # Try moving to each other rack
-            for to_rack_id in state.rack_jigs.keys():
-                if from_rack_id != to_rack_id:
-                    action = MoveJigBetweenRacks(jig_id, from_rack_id, to_rack_id)
-                    if state.is_valid_action(action, instance_data):
-                        all_actions.append((action, "move"))
-    
-    # 2. Generate SendJigToProduction actions
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+            # Try moving to each other rack that can fit the jig
+            for to_rack_id in rack_ids:
+                if from_rack_id != to_rack_id and jig_size <= free_space[to_rack_id]:
+                    yield MoveJigBetweenRacks(jig_id, from_rack_id, to_rack_id)
+
+def _generate_production_actions(state, instance_data, context):
+    """Yield valid SendJigToProduction actions for factory-side jigs."""
+    production_schedule = context['production_schedule_set']
     
     for rack_id, jigs in state.rack_jigs.items():
         if not jigs:
@@ -75,49 +73,64 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True):
             if jig_id in production_schedule and loaded:
                 action = SendJigToProduction(jig_id, rack_id)
                 if state.is_valid_action(action, instance_data):
-                    all_actions.append((action, "produce"))
-    
-    # 3. Generate ReturnEmptyJigFromFactory actions
+                    yield action
+
+def _generate_return_actions(state, instance_data, context):
+    """Yield valid ReturnEmptyJigFromFactory actions for empty factory jigs."""
     for jig_id in state.factory_jigs:
         # Check if jig is empty
         loaded, _ = state.jig_status.get(jig_id, (False, ""))
         if not loaded:
             # Try returning to each rack
-            for rack_id in state.rack_jigs.keys():
+            for rack_id in context['rack_ids']:
                 action = ReturnEmptyJigFromFactory(jig_id, rack_id)
                 if state.is_valid_action(action, instance_data):
-                    all_actions.append((action, "return"))
-    
-    # 4. Generate ProcessNextFlight action if not at the last flight
-    if state.current_flight_idx < len(instance_data.get('flights', [])) - 1:
+                    yield action
+
+def _generate_flight_actions(state, instance_data, context):
+    """Yield the ProcessNextFlight action if not at the last flight."""
+    if state.current_flight_idx < context['num_flights'] - 1:
         action = ProcessNextFlight()
         if state.is_valid_action(action, instance_data):
-            all_actions.append((action, "flight"))
+            yield action
+
+def get_all_possible_actions(state, instance_data, prioritize_goals=True, context=None):
+    """
+    Generate all possible actions from the current state.
+    
+    Actions are produced lazily, one tier (action type) at a time, so a
+    caller that stops early never pays for the expensive move enumeration.
+    
+    Args:
+        state: Current BelugaState
+        instance_data: Problem instance data
+        prioritize_goals: Whether to prioritize actions that directly 
+                         contribute to goal conditions
+        context: Optional search context from build_search_context; built
+                 on the fly when not given
     
-    # 5. Generate LoadJigToBeluga and UnloadJigFromBeluga actions
-    # For simplicity, we're not implementing these in this one-day version
+    Returns:
+        Iterator over possible actions, ordered by priority if prioritize_goals is True
+    """
+    # LoadJigToBeluga and UnloadJigFromBeluga actions are not generated;
+    # for simplicity, we're not implementing these in this one-day version
     
-    # If we're prioritizing goal-relevant actions, sort them
     if prioritize_goals:
         # Priority order: production > returning empty jigs > processing flights > moving jigs
-        action_priority = {
-            "produce": 0,  # Highest priority
-            "return": 1,
-            "flight": 2,
-            "move": 3       # Lowest priority
-        }
-        
-        # Sort by priority
-        all_actions.sort(key=lambda x: action_priority[x[1]])
-        
-        # Extract just the actions
-        return [action for action, _ in all_actions]
+        tiers = (_generate_production_actions, _generate_return_actions,
+                 _generate_flight_actions, _generate_move_actions)
     else:
-        # Return actions in original order
-        return [action for action, _ in all_actions]
+        # Original generation order
+        tiers = (_generate_move_actions, _generate_production_actions,
+                 _generate_return_actions, _generate_flight_actions)
+    
+    if context is None:
+        context = build_search_context(instance_data)
+    
+    return chain.from_iterable(tier(state, instance_data, context) for tier in tiers)
 
 def astar_search(initial_state, instance_data, max_iterations=10000, time_limit=60, 
-                heuristic_variant="standard", prioritize_actions=False):
+                heuristic_variant="standard", prioritize_actions=False, stats=None):
     """
     Perform A* search to find the optimal plan.
     
@@ -128,6 +141,8 @@ def astar_search(initial_state, instance_data, max_iterations=10000, time_limit=
         time_limit: Time limit in seconds (default: 60)
         heuristic_variant: Which heuristic to use (standard, weighted, production_focus)
         prioritize_actions: Whether to prioritize goal-relevant actions
+        stats: Optional dict that receives the iteration count and the
+               periodic progress samples of the search
     
     Returns:
         List of actions forming the plan, or None if no plan found
@@ -136,26 +151,48 @@ def astar_search(initial_state, instance_data, max_iterations=10000, time_limit=
     start_time = time.time()
     
     # Initialize data structures
-    open_set = PriorityQueue()
-    open_set.put(initial_state, 0)
+    # Each distinct state is hashed once, when it is first reached, and is
+    # referred to by an integer id everywhere else in the search
+    state_ids = {initial_state: 0}  # Maps state -> state id
+    states = [initial_state]  # Maps state id -> state
+    cost_so_far = array('l', [0])  # Maps state id -> best known cost, stored unboxed
+    came_from = {}  # Maps state id -> (previous state id, action)
     
-    came_from = {}  # Maps state -> (previous_state, action)
-    cost_so_far = {initial_state: 0}
+    # Open set is a bare heap of packed (priority, entry_count, state_id) ints;
+    # the entry count breaks ties in FIFO order. The most recent entry is held
+    # back in pending so that pushing it and the next pop fuse into a single
+    # heappushpop, which yields the same entry as a push followed by a pop
+    open_set = []
+    pending = 0  # Initial state: priority 0, entry 0, state id 0
+    entry_count = 1
+    
+    # Instance lookups that are constant for the whole search
+    context = build_search_context(instance_data)
     
     iterations = 0
     states_explored = 0
+    progress_samples = []
+    if stats is not None:
+        stats['progress'] = progress_samples
     
     # Main A* search loop
-    while not open_set.is_empty() and iterations < max_iterations:
+    while (open_set or pending is not None) and iterations < max_iterations:
         iterations += 1
         
         # Check time limit
         if time.time() - start_time > time_limit:
             print(f"Time limit of {time_limit} seconds reached. Aborting search.")
+            if stats is not None:
+                stats['iterations'] = iterations
             return None
         
         # Get the state with lowest estimated total cost
-        current_state = open_set.get()
+        if pending is None:
+            current_id = heapq.heappop(open_set) & ID_MASK
+        else:
+            current_id = heapq.heappushpop(open_set, pending) & ID_MASK
+            pending = None
+        current_state = states[current_id]
         states_explored += 1
         
         # Check for goal state
@@ -163,50 +200,66 @@ def astar_search(initial_state, instance_data, max_iterations=10000, time_limit=
             print(f"Goal reached after {iterations} iterations!")
             print(f"Total states explored: {states_explored}")
             print(f"Search time: {time.time() - start_time:.2f} seconds")
+            if stats is not None:
+                stats['iterations'] = iterations
             
             # Reconstruct the plan
-            return reconstruct_plan(came_from, current_state)
+            return reconstruct_plan(came_from, current_id)
         
         # Print progress every 100 iterations
         if iterations % 100 == 0:
             progress = check_goal_progress(current_state, instance_data)
             print(f"Iteration {iterations}: Flights: {progress['flights_progress']}, Parts: {progress['parts_progress']}")
+            progress_samples.append({"iteration": iterations, "flights": progress['flights_processed'],
+                                     "parts": progress['parts_produced']})
+        
+        # Calculate cost once per expansion (uniform cost for every action)
+        new_cost = cost_so_far[current_id] + 1
         
         # Generate all possible actions, possibly prioritizing goal-relevant ones
-        for action in get_all_possible_actions(current_state, instance_data, prioritize_actions):
-            # Get resulting state
-            next_state = current_state.get_next_state(action, instance_data)
-            if next_state is None:
-                continue  # Invalid action/state
+        for action in get_all_possible_actions(current_state, instance_data, prioritize_actions, context):
+            # Get resulting state; generated actions are valid by construction
+            next_state = current_state.get_next_state(action, instance_data, validated=True)
             
-            # Calculate cost
-            new_cost = cost_so_far[current_state] + 1  # Uniform cost
+            # If state is new or we found a better path (single hash lookup)
+            next_id = state_ids.get(next_state)
+            if next_id is None:
+                next_id = len(states)
+                state_ids[next_state] = next_id
+                states.append(next_state)
+                cost_so_far.append(new_cost)
+            elif new_cost < cost_so_far[next_id]:
+                cost_so_far[next_id] = new_cost
+            else:
+                continue
             
-            # If state is new or we found a better path
-            if next_state not in cost_so_far or new_cost < cost_so_far[next_state]:
-                cost_so_far[next_state] = new_cost
-                # Calculate priority using heuristic
-                priority = new_cost + heuristic(next_state, instance_data, variant=heuristic_variant)
-                open_set.put(next_state, priority)
-                came_from[next_state] = (current_state, action)
+            # Calculate priority using heuristic
+            priority = new_cost + heuristic(next_state, instance_data, variant=heuristic_variant)
+            if pending is not None:
+                heapq.heappush(open_set, pending)
+            pending = (round(priority * PRIORITY_SCALE) << (2 * ID_BITS)) | (entry_count << ID_BITS) | next_id
+            entry_count += 1
+            came_from[next_id] = (current_id, action)
     
     # If we got here, search failed
     print(f"Search failed after {iterations} iterations.")
     print(f"Total states explored: {states_explored}")
     print(f"Search time: {time.time() - start_time:.2f} seconds")
+    if stats is not None:
+        stats['iterations'] = iterations
     return None
 
-def reconstruct_plan(came_from, goal_state):
+def reconstruct_plan(came_from, goal_id):
     """
-    Reconstruct the plan by working backwards from the goal state.
+    Reconstruct the plan by working backwards from the goal state id.
     """
     actions = []
-    current_state = goal_state
+    current_id = goal_id
     
-    while current_state in came_from:
-        previous_state, action = came_from[current_state]
+    while current_id in came_from:
+        previous_id, action = came_from[current_id]
         actions.append(action)
-        current_state = previous_state
+        current_id = previous_id
     
     # Reverse the list since we worked backwards
     actions.reverse()
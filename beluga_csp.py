@@ -5,7 +5,12 @@ of the Beluga XL cargo management problem.
 """
 
 from typing import Dict, List, Set, Tuple, FrozenSet, Any
-from collections import defaultdict
+from collections import defaultdict, deque
+from beluga_instance import get_instance_cache
+
+def precedes(v1, v2) -> bool:
+    """Precedence constraint: the first value must come strictly before the second."""
+    return v1 < v2
 
 class BelugaCSP:
     """Representation of the Beluga problem as a constraint satisfaction problem."""
@@ -21,11 +26,66 @@ class BelugaCSP:
         self.state = state
         self.instance_data = instance_data
         
+        # Rack capacities and per-jig sizes are precomputed once per instance,
+        # with the jig -> jig type -> size lookups flattened into per-jig tables
+        cache = get_instance_cache(instance_data)
+        self.rack_capacity = cache.rack_size
+        self.size_loaded = cache.size_loaded
+        self.size_empty = cache.size_empty
+        self.jig_size = self._extract_jig_sizes()
+        
         # Extract the domains for each decision variable
         self.domains = self._extract_domains()
         
         # Extract constraints
         self.constraints = self._extract_constraints()
+        
+        # Outcome of reduce_domains, once it has run
+        self.reduced = None
+    
+    @classmethod
+    def fork(cls, parent: 'BelugaCSP', state) -> 'BelugaCSP':
+        """
+        Build the CSP of a state that is a neighbour of parent's state.
+        
+        Only the jig domains depend on where the jigs are. The flight and
+        production domains, the constraints between them and the outcome of
+        propagating them depend only on the flight index and the produced
+        parts. When those match the parent's, they are shared with the parent
+        (including any reduction already done) and only the jig domains are
+        rebuilt; otherwise the CSP is built from scratch.
+        
+        Args:
+            parent: CSP of a state of the same instance
+            state: BelugaState to build the CSP for
+            
+        Returns:
+            BelugaCSP for state
+        """
+        if (state.current_flight_idx != parent.state.current_flight_idx
+                or state.produced_parts != parent.state.produced_parts):
+            return cls(state, parent.instance_data)
+        
+        csp = cls.__new__(cls)
+        csp.state = state
+        csp.instance_data = parent.instance_data
+        csp.rack_capacity = parent.rack_capacity
+        csp.size_loaded = parent.size_loaded
+        csp.size_empty = parent.size_empty
+        csp.jig_size = csp._extract_jig_sizes()
+        
+        # Jig domains come first, as in _extract_domains; reduction never
+        # replaces domain lists in place, so the parent's lists can be shared
+        csp.domains = csp._extract_jig_domains()
+        for var, domain in parent.domains.items():
+            if var not in csp.domains:
+                csp.domains[var] = domain
+        
+        csp.constraints = parent.constraints
+        csp.constraint_by_pair = parent.constraint_by_pair
+        csp.neighbors = parent.neighbors
+        csp.reduced = parent.reduced
+        return csp
     
     def _extract_domains(self) -> Dict[str, List[Any]]:
         """
@@ -34,11 +94,37 @@ class BelugaCSP:
         Returns:
             Dict mapping variable names to their domains
         """
+        domains = self._extract_jig_domains()
+        domains.update(self._extract_schedule_domains())
+        return domains
+    
+    def _extract_jig_domains(self) -> Dict[str, List[str]]:
+        """
+        Extract the location domain of every jig.
+        
+        Returns:
+            Dict mapping jig variable names to their domains
+        """
         domains = {}
         
         # 1. Jig assignment domains - where each jig can go
+        # Rack capacity is enforced here as a unary filter on each domain
+        residual_capacity = {rack_id: self.rack_capacity.get(rack_id, 0) - self._get_rack_occupancy(rack_id)
+                             for rack_id in self.state.rack_jigs}
         for jig_id in self.instance_data.get('jigs', {}):
-            domains[f"jig_{jig_id}"] = self._get_jig_domain(jig_id)
+            domains[f"jig_{jig_id}"] = self._filter_rack_from_domain(
+                jig_id, self._get_jig_domain(jig_id), residual_capacity)
+        
+        return domains
+    
+    def _extract_schedule_domains(self) -> Dict[str, List[int]]:
+        """
+        Extract the flight and production ordering domains.
+        
+        Returns:
+            Dict mapping flight and production variable names to their domains
+        """
+        domains = {}
         
         # 2. Flight processing domains - order of flight processing
         current_flight_idx = self.state.current_flight_idx
@@ -48,9 +134,7 @@ class BelugaCSP:
             domains[f"flight_{i}"] = list(range(current_flight_idx, total_flights))
         
         # 3. Production sequence domains - order of part production
-        production_schedule = []
-        for line in self.instance_data.get('production_lines', []):
-            production_schedule.extend(line.get('schedule', []))
+        production_schedule = get_instance_cache(self.instance_data).production_schedule
         
         for i, jig_id in enumerate(production_schedule):
             if jig_id not in self.state.produced_parts:
@@ -86,6 +170,50 @@ class BelugaCSP:
         
         return potential_locations
     
+    def _extract_jig_sizes(self) -> Dict[str, int]:
+        """
+        Get the current size of every jig, depending on whether it is loaded.
+        
+        Returns:
+            Dict mapping jig IDs to their current size
+        """
+        jig_status = self.state.jig_status
+        return {jig_id: self.size_loaded[jig_id] if jig_status.get(jig_id, (False, ""))[0]
+                else self.size_empty[jig_id]
+                for jig_id in self.size_loaded}
+    
+    def _get_rack_occupancy(self, rack_id: str) -> int:
+        """
+        Get the total size of the jigs currently stored in a rack.
+        
+        Args:
+            rack_id: ID of the rack
+            
+        Returns:
+            Occupied space in the rack
+        """
+        return sum(map(self.jig_size.__getitem__, self.state.rack_jigs.get(rack_id, ())))
+    
+    def _filter_rack_from_domain(self, jig_id: str, domain: List[str],
+                                 residual_capacity: Dict[str, int]) -> List[str]:
+        """
+        Remove racks that cannot fit a jig from its location domain.
+        
+        Args:
+            jig_id: ID of the jig
+            domain: Candidate locations for the jig
+            residual_capacity: Free space per rack in the current state
+            
+        Returns:
+            Domain without the racks that are too full for the jig
+        """
+        jig_size = self.jig_size[jig_id]
+        current_rack = self.state.get_jig_location(jig_id)
+        return [location for location in domain
+                if location not in residual_capacity
+                or location == current_rack
+                or residual_capacity[location] >= jig_size]
+    
     def _extract_constraints(self) -> List[Tuple]:
         """
         Extract the constraints for the CSP.
@@ -95,22 +223,8 @@ class BelugaCSP:
         """
         constraints = []
         
-        # 1. Rack capacity constraints
-        for rack_id, jigs in self.state.rack_jigs.items():
-            # Find rack size
-            rack_size = 0
-            for rack in self.instance_data.get('racks', []):
-                if rack.get('name') == rack_id:
-                    rack_size = rack.get('size', 0)
-                    break
-            
-            # Add capacity constraint for each pair of jigs that might go to this rack
-            jig_vars = [f"jig_{jig_id}" for jig_id in self.instance_data.get('jigs', {})]
-            for i, var1 in enumerate(jig_vars):
-                for var2 in jig_vars[i+1:]:
-                    constraints.append((var1, var2, 
-                        lambda v1, v2, r=rack_id, rs=rack_size: 
-                            not (v1 == r and v2 == r) or self._check_rack_capacity(r, rs)))
+        # 1. Rack capacity is a unary constraint on each jig domain and is
+        # applied by _filter_rack_from_domain, so no pairwise constraints here
         
         # 2. Flight precedence constraints
         flight_vars = [f"flight_{i}" for i in range(
@@ -120,7 +234,7 @@ class BelugaCSP:
         for i, var1 in enumerate(flight_vars):
             for j, var2 in enumerate(flight_vars):
                 if i < j:  # Flight i must be processed before flight j
-                    constraints.append((var1, var2, lambda v1, v2: v1 < v2))
+                    constraints.append((var1, var2, precedes))
         
         # 3. Production precedence constraints
         production_lines = self.instance_data.get('production_lines', [])
@@ -130,101 +244,63 @@ class BelugaCSP:
                 var1 = f"prod_{schedule[i]}"
                 var2 = f"prod_{schedule[i+1]}"
                 if var1 in self.domains and var2 in self.domains:
-                    constraints.append((var1, var2, lambda v1, v2: v1 < v2))
+                    constraints.append((var1, var2, precedes))
+        
+        # Index constraints by variable pair (both directions) so arc revision
+        # can find them without scanning the full constraint list, and record
+        # for each variable the variables whose arcs point at it
+        self.constraint_by_pair = defaultdict(list)
+        neighbors = defaultdict(dict)
+        for var1, var2, constraint_func in constraints:
+            self.constraint_by_pair[(var1, var2)].append(constraint_func)
+            self.constraint_by_pair[(var2, var1)].append(constraint_func)
+            neighbors[var2][var1] = None
+        self.neighbors = {var: list(sources) for var, sources in neighbors.items()}
         
         return constraints
     
-    def _check_rack_capacity(self, rack_id: str, rack_size: int) -> bool:
-        """
-        Check if adding another jig to the rack would exceed its capacity.
-        
-        Args:
-            rack_id: ID of the rack
-            rack_size: Size limit of the rack
-            
-        Returns:
-            True if capacity constraint is satisfied, False otherwise
+    def reduce_domains(self) -> bool:
         """
-        # Get current occupancy
-        current_occupancy = 0
-        for jig_id in self.state.rack_jigs.get(rack_id, ()):
-            # Get the jig type
-            jig_type = self.instance_data['jigs'][jig_id]['type']
-            
-            # Determine if jig is loaded or empty
-            loaded, _ = self.state.jig_status.get(jig_id, (False, ""))
-            
-            # Get the size from jig_types
-            if loaded:
-                jig_size = self.instance_data['jig_types'][jig_type]['size_loaded']
-            else:
-                jig_size = self.instance_data['jig_types'][jig_type]['size_empty']
-            
-            current_occupancy += jig_size
+        Apply constraint propagation to reduce domains.
+        Similar to AC-3 algorithm for arc consistency.
         
-        # There's room for at least one more jig
-        return current_occupancy < rack_size
-    
-    def arc_consistent(self) -> bool:
-        """
-        Check if the CSP is arc consistent.
+        A True result means every arc has been revised against its
+        constraint, so it also serves as the arc consistency check. The
+        outcome is kept in self.reduced, so propagation runs at most once per
+        CSP, including CSPs forked from an already reduced parent.
         
         Returns:
-            True if arc consistent, False otherwise
+            True if domains were successfully reduced, False if inconsistency detected
         """
-        # Simplified arc consistency check
-        for var1, domain1 in self.domains.items():
-            for var2, domain2 in self.domains.items():
-                if var1 != var2:
-                    # Find constraints between var1 and var2
-                    for v1, v2, constraint_func in self.constraints:
-                        if (v1 == var1 and v2 == var2) or (v1 == var2 and v2 == var1):
-                            # Check if there's at least one value in domain1 that
-                            # is consistent with at least one value in domain2
-                            consistent = False
-                            for val1 in domain1:
-                                for val2 in domain2:
-                                    if constraint_func(val1, val2):
-                                        consistent = True
-                                        break
-                                if consistent:
-                                    break
-                            
-                            if not consistent:
-                                return False
-        
-        return True
+        if self.reduced is None:
+            self.reduced = self._propagate()
+        return self.reduced
     
-    def reduce_domains(self) -> bool:
+    def _propagate(self) -> bool:
         """
-        Apply constraint propagation to reduce domains.
-        Similar to AC-3 algorithm for arc consistency.
+        Run AC-3 over all constraint arcs.
         
         Returns:
             True if domains were successfully reduced, False if inconsistency detected
         """
         # Queue of arcs to process
-        arcs = []
+        arcs = deque()
         for var1, var2, _ in self.constraints:
             arcs.append((var1, var2))
             arcs.append((var2, var1))  # Bidirectional
         
         while arcs:
-            var1, var2 = arcs.pop(0)
+            var1, var2 = arcs.popleft()
             
             # Skip if variables not in domains
             if var1 not in self.domains or var2 not in self.domains:
                 continue
                 
             # Find the relevant constraint
-            constraint = None
-            for v1, v2, constraint_func in self.constraints:
-                if (v1 == var1 and v2 == var2) or (v1 == var2 and v2 == var1):
-                    constraint = constraint_func
-                    break
-            
-            if constraint is None:
+            constraints = self.constraint_by_pair.get((var1, var2))
+            if not constraints:
                 continue
+            constraint = constraints[0]
                 
             # Check if we need to revise the domain of var1
             if self._revise_domain(var1, var2, constraint):
@@ -233,8 +309,8 @@ class BelugaCSP:
                     return False  # Inconsistency detected
                     
                 # Add affected arcs back to the queue
-                for v1, v2, _ in self.constraints:
-                    if v2 == var1 and v1 != var2:
+                for v1 in self.neighbors.get(var1, ()):
+                    if v1 != var2:
                         arcs.append((v1, var1))
         
         return True
@@ -253,25 +329,29 @@ class BelugaCSP:
         """
         revised = False
 
-        domain1 = list(self.domains[var1])  # Copy to avoid modifying during iteration
+        domain1 = self.domains[var1]
+        domain2 = self.domains[var2]
         to_remove = []
-        for val1 in domain1:
-            # Check if there's at least one value in domain2 that satisfies the constraint
-            satisfies = False
-            for val2 in self.domains[var2]:
-                if constraint(val1, val2):
-                    satisfies = True
-                    break
-            
-            # If no such value exists, mark for removal
-            if not satisfies:
-                to_remove.append(val1)
-                revised = True
+        if constraint is precedes:
+            # A value is supported iff it is below the largest value of var2,
+            # so one max() replaces the pairwise scan over both domains
+            if domain2:
+                upper_bound = max(domain2)
+                to_remove = [val1 for val1 in domain1 if not val1 < upper_bound]
+            else:
+                to_remove = domain1
+            revised = bool(to_remove)
+        else:
+            for val1 in domain1:
+                # Mark for removal if no value in domain2 satisfies the constraint
+                if not any(constraint(val1, val2) for val2 in domain2):
+                    to_remove.append(val1)
+                    revised = True
 
-        # Remove values, but ensure we don't empty the domain completely
-        if len(to_remove) < len(domain1):  # Don't remove everything
-            for val in to_remove:
-                self.domains[var1].remove(val)
+        # Remove values in a single rebuild, but ensure we don't empty the domain completely
+        if 0 < len(to_remove) < len(domain1):  # Don't remove everything
+            to_remove_set = set(to_remove)
+            self.domains[var1] = [val for val in domain1 if val not in to_remove_set]
 
         return revised
 
@@ -282,8 +362,11 @@ class BelugaCSP:
         Returns:
             Dict with domain size information
         """
+        smallest_domain = min(self.domains.items(), key=lambda x: len(x[1])) if self.domains else None
         return {
             'domain_sizes': {var: len(domain) for var, domain in self.domains.items()},
-            'smallest_domain': min(self.domains.items(), key=lambda x: len(x[1])) if self.domains else None,
+            'smallest_domain': smallest_domain,
             'largest_domain': max(self.domains.items(), key=lambda x: len(x[1])) if self.domains else None,
+            # Size of the smallest domain, computed once for the callers' heuristics
+            'min_domain_size': len(smallest_domain[1]) if smallest_domain else 0,
         }
\ No newline at end of file
@@ -7,7 +7,7 @@ def debug_action_generation(state, instance_data):
     from beluga_utils import print_state
     print_state(state, instance_data)
     
-    actions = get_all_possible_actions(state, instance_data)
+    actions = list(get_all_possible_actions(state, instance_data))
     print(f"\nGenerated {len(actions)} possible actions:")
     
     # Group actions by type
@@ -33,6 +33,7 @@ def debug_action_generation(state, instance_data):
 def debug_heuristic(state, instance_data):
     """Debug the heuristic function."""
     from beluga_heuristic import heuristic
+    from beluga_instance import get_instance_cache
     
     print("\nDebugging heuristic function...")
     print("Current state:")
@@ -47,13 +48,12 @@ def debug_heuristic(state, instance_data):
     flights_remaining = max(0, len(flights) - state.current_flight_idx - 1)
     
     # Collect production schedule
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+    cache = get_instance_cache(instance_data)
+    production_schedule = cache.production_schedule_set
     
     # Count parts to produce
     parts_to_produce = []
-    for jig_id in production_schedule:
+    for jig_id in cache.production_schedule:
         loaded, part_id = state.jig_status.get(jig_id, (False, ""))
         if loaded and part_id and part_id not in state.produced_parts:
             parts_to_produce.append(part_id)
@@ -4,6 +4,7 @@ Implements the forward checking algorithm for constraint propagation.
 """
 
 from beluga_csp import BelugaCSP
+from beluga_instance import get_instance_cache
 from typing import Dict, List, Optional, Tuple, Any
 
 class BelugaForwardChecker:
@@ -17,9 +18,29 @@ class BelugaForwardChecker:
             state: Current BelugaState
             instance_data: Problem instance data
         """
-        self.state = state
         self.instance_data = instance_data
-        self.csp = BelugaCSP(state, instance_data)
+        self._csp = None
+        self.bind(state)
+    
+    def bind(self, state):
+        """
+        Rebind the forward checker to another state of the same instance.
+        
+        Args:
+            state: BelugaState to check from now on
+        """
+        self.state = state
+    
+    @property
+    def csp(self) -> BelugaCSP:
+        """CSP for the bound state, built on first use since only check_forward needs it."""
+        if self._csp is None:
+            self._csp = BelugaCSP(self.state, self.instance_data)
+        elif self._csp.state is not self.state:
+            # Successive states differ by a single action, so the last CSP
+            # is forked instead of being rebuilt from scratch
+            self._csp = BelugaCSP.fork(self._csp, self.state)
+        return self._csp
     
     def check_forward(self) -> Tuple[bool, Dict[str, Any]]:
         """
@@ -45,42 +66,30 @@ class BelugaForwardChecker:
         Returns:
             ID of the most constrained rack, or None if no racks
         """
-        if not self.state.rack_jigs:
-            return None
-            
-        rack_constraints = {}
+        # Track the rack with the least available space while scanning;
+        # ties keep the first rack, and no racks leaves None
+        best_rack = None
+        best_space = float('inf')
+        
+        # Rack and jig sizes come from the precomputed instance tables
+        cache = get_instance_cache(self.instance_data)
+        jig_status = self.state.jig_status
+        size_loaded = cache.size_loaded
+        size_empty = cache.size_empty
         
         for rack_id, jigs in self.state.rack_jigs.items():
-            # Find rack size
-            rack_size = 0
-            for rack in self.instance_data.get('racks', []):
-                if rack.get('name') == rack_id:
-                    rack_size = rack.get('size', 0)
-                    break
-            
-            # Calculate current occupancy
-            current_occupancy = 0
-            for jig_id in jigs:
-                # Get the jig type
-                jig_type = self.instance_data['jigs'][jig_id]['type']
-                
-                # Determine if jig is loaded or empty
-                loaded, _ = self.state.jig_status.get(jig_id, (False, ""))
-                
-                # Get the size from jig_types
-                if loaded:
-                    jig_size = self.instance_data['jig_types'][jig_type]['size_loaded']
-                else:
-                    jig_size = self.instance_data['jig_types'][jig_type]['size_empty']
-                
-                current_occupancy += jig_size
+            # Calculate current occupancy, using the loaded or empty size of each jig
+            current_occupancy = sum(size_loaded[jig_id] if jig_status.get(jig_id, (False, ""))[0]
+                                    else size_empty[jig_id]
+                                    for jig_id in jigs)
             
             # Calculate available space
-            available_space = rack_size - current_occupancy
-            rack_constraints[rack_id] = available_space
+            available_space = cache.rack_size.get(rack_id, 0) - current_occupancy
+            if available_space < best_space:
+                best_rack, best_space = rack_id, available_space
         
         # Return the rack with the least available space
-        return min(rack_constraints.items(), key=lambda x: x[1])[0] if rack_constraints else None
+        return best_rack
     
     def get_production_bottlenecks(self) -> List[str]:
         """
@@ -91,27 +100,20 @@ class BelugaForwardChecker:
         """
         bottlenecks = []
         
-        # Collect production schedule
-        production_schedule = []
-        for line in self.instance_data.get('production_lines', []):
-            production_schedule.extend(line.get('schedule', []))
-        
         # Find jigs that are in production schedule but blocked in racks
-        for jig_id in production_schedule:
+        for jig_id in get_instance_cache(self.instance_data).production_schedule:
             # Skip if already produced
             if jig_id in self.state.produced_parts:
                 continue
                 
             # Check if jig is in a rack
-            location = self.state.get_jig_location(jig_id)
-            if location not in ["beluga", "factory", None] and location in self.state.rack_jigs:
-                rack_jigs = self.state.rack_jigs[location]
+            position = self.state.jig_positions.get(jig_id)
+            if position is not None:
+                rack_id, jig_index = position
                 
                 # Check if jig is in the middle (not at an edge)
-                if jig_id in rack_jigs:
-                    jig_index = rack_jigs.index(jig_id)
-                    if 0 < jig_index < len(rack_jigs) - 1:
-                        bottlenecks.append(jig_id)
+                if 0 < jig_index < len(self.state.rack_jigs[rack_id]) - 1:
+                    bottlenecks.append(jig_id)
         
         return bottlenecks
     
@@ -1,3 +1,5 @@
+from beluga_instance import get_instance_cache
+
 def is_goal_state(state, instance_data):
     """
     Check if the state satisfies all goal conditions:
@@ -10,9 +12,7 @@ def is_goal_state(state, instance_data):
         return False  # Still have flights to process
     
     # 2. Check if all parts in production schedule have been produced
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+    production_schedule = get_instance_cache(instance_data).production_schedule
     
     for jig_id in production_schedule:
         loaded, part_id = state.jig_status.get(jig_id, (False, ""))
@@ -37,9 +37,7 @@ def check_goal_progress(state, instance_data):
     flights_processed = state.current_flight_idx
     
     # Get production schedule
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+    production_schedule = get_instance_cache(instance_data).production_schedule
     
     # Count parts produced
     parts_produced = len(state.produced_parts)
@@ -116,9 +114,7 @@ def check_production_requirements(state, instance_data):
         dict: Information about production requirements status
     """
     # Collect production schedule
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+    production_schedule = get_instance_cache(instance_data).production_schedule
     
     total_parts = 0
     produced_parts = 0
@@ -4,9 +4,11 @@ Combines A* search with CSP constraint propagation techniques.
 """
 
 import heapq
+from array import array
 import time
 import random
-from collections import defaultdict
+from collections import defaultdict, deque
+from operator import itemgetter
 from typing import Dict, List, Optional, Tuple, Any
 
 from beluga_heuristic import heuristic
@@ -14,25 +16,67 @@ from beluga_goal import is_goal_state, check_goal_progress
 from beluga_actions import MoveJigBetweenRacks, LoadJigToBeluga, UnloadJigFromBeluga, SendJigToProduction, ReturnEmptyJigFromFactory, ProcessNextFlight
 from beluga_forward_checking import BelugaForwardChecker
 from beluga_local_search import BelugaLocalSearch
+from beluga_instance import get_instance_cache
 
-class PriorityQueue:
-    """A priority queue implementation for the A* search."""
+# Action priorities, from highest to lowest:
+# production > urgent > flight > return > move > low
+PRIORITY_PRODUCE = 0  # Highest priority - directly contributes to production
+PRIORITY_URGENT = 1   # High priority - bottleneck jigs
+PRIORITY_FLIGHT = 2   # Medium-high priority - needed for progress
+PRIORITY_RETURN = 3   # Medium priority - frees up factory
+PRIORITY_MOVE = 4     # Lower priority - general movement
+PRIORITY_LOW = 5      # Lowest priority - potentially problematic
+
+# Maximum number of promising states kept as random restart points
+MAX_RESTART_STATES = 64
+
+# The time limit is checked once every 256 iterations (iterations & mask == 0)
+TIME_CHECK_MASK = 0xFF
+
+class BucketPriorityQueue:
+    """
+    A bucket priority queue for the A* search.
+    
+    Items are kept in one FIFO bucket per distinct priority, and only the
+    distinct priorities are kept in a heap. Many successors share a priority,
+    so most puts and gets are deque operations instead of heap operations,
+    while items still come out in (priority, insertion order) order.
+    """
     
     def __init__(self):
-        self.elements = []
-        self.entry_count = 0  # Used to break ties consistently
+        self.buckets = {}  # Maps priority -> deque of items in insertion order
+        self.priorities = []  # Heap of the priorities that have a bucket
+        self.size = 0  # Number of items over all buckets
     
     def is_empty(self):
-        return len(self.elements) == 0
+        return not self.priorities
+    
+    def __len__(self):
+        return self.size
+    
+    def peek_priority(self):
+        """Return the lowest priority in the queue, or None if it is empty."""
+        return self.priorities[0] if self.priorities else None
     
     def put(self, item, priority):
-        # Add entry_count to break ties and ensure FIFO behavior for equal priorities
-        heapq.heappush(self.elements, (priority, self.entry_count, item))
-        self.entry_count += 1
+        bucket = self.buckets.get(priority)
+        if bucket is None:
+            bucket = self.buckets[priority] = deque()
+            heapq.heappush(self.priorities, priority)
+        # FIFO within a bucket keeps ties in insertion order
+        bucket.append(item)
+        self.size += 1
     
     def get(self):
-        # Return the item, discarding priority and entry_count
-        return heapq.heappop(self.elements)[2]
+        # Take the oldest item of the lowest priority, dropping its bucket once empty
+        priority = self.priorities[0]
+        bucket = self.buckets[priority]
+        item = bucket.popleft()
+        self.size -= 1
+        if not bucket:
+            del self.buckets[priority]
+            heapq.heappop(self.priorities)
+        return item
 
 def get_all_possible_actions(state, instance_data, prioritize_goals=True, forward_checker=None):
     """
@@ -51,14 +95,11 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True, forwar
     all_actions = []
     
     # If we have a forward checker, use it to guide action generation
-    bottleneck_jigs = []
+    bottleneck_jigs = frozenset()
     constrained_rack = None
     if forward_checker:
-        # Perform forward checking
-        success, _ = forward_checker.check_forward()
-        
         # Get bottleneck jigs from production schedule
-        bottleneck_jigs = forward_checker.get_production_bottlenecks()
+        bottleneck_jigs = frozenset(forward_checker.get_production_bottlenecks())
         
         # Get most constrained rack
         constrained_rack = forward_checker.get_most_constrained_rack()
@@ -74,14 +115,14 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True, forwar
                 continue  # Skip if jig not found (shouldn't happen)
             
             # Prioritize moving bottleneck jigs
-            priority = "urgent" if jig_id in bottleneck_jigs else "move"
+            priority = PRIORITY_URGENT if jig_id in bottleneck_jigs else PRIORITY_MOVE
             
             # Try moving to each other rack
             for to_rack_id in state.rack_jigs.keys():
                 if from_rack_id != to_rack_id:
                     # Lower priority if moving to constrained rack
                     if to_rack_id == constrained_rack:
-                        temp_priority = "low"
+                        temp_priority = PRIORITY_LOW
                     else:
                         temp_priority = priority
                     
@@ -90,9 +131,8 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True, forwar
                         all_actions.append((action, temp_priority))
     
     # 2. Generate SendJigToProduction actions
-    production_schedule = []
-    for line in instance_data.get('production_lines', []):
-        production_schedule.extend(line.get('schedule', []))
+    cache = get_instance_cache(instance_data)
+    production_schedule = cache.production_schedule_set
     
     for rack_id, jigs in state.rack_jigs.items():
         if not jigs:
@@ -107,7 +147,7 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True, forwar
             if jig_id in production_schedule and loaded:
                 action = SendJigToProduction(jig_id, rack_id)
                 if state.is_valid_action(action, instance_data):
-                    all_actions.append((action, "produce"))
+                    all_actions.append((action, PRIORITY_PRODUCE))
     
     # 3. Generate ReturnEmptyJigFromFactory actions
     for jig_id in state.factory_jigs:
@@ -117,46 +157,34 @@ def get_all_possible_actions(state, instance_data, prioritize_goals=True, forwar
             # Try returning to each rack
             for rack_id in state.rack_jigs.keys():
                 # Lower priority if returning to constrained rack
-                priority = "low" if rack_id == constrained_rack else "return"
+                priority = PRIORITY_LOW if rack_id == constrained_rack else PRIORITY_RETURN
                 
                 action = ReturnEmptyJigFromFactory(jig_id, rack_id)
                 if state.is_valid_action(action, instance_data):
                     all_actions.append((action, priority))
     
     # 4. Generate ProcessNextFlight action if not at the last flight
-    if state.current_flight_idx < len(instance_data.get('flights', [])) - 1:
+    if state.current_flight_idx < cache.num_flights - 1:
         action = ProcessNextFlight()
         if state.is_valid_action(action, instance_data):
-            all_actions.append((action, "flight"))
+            all_actions.append((action, PRIORITY_FLIGHT))
     
     # 5. Generate LoadJigToBeluga and UnloadJigFromBeluga actions
     # For simplicity, we're not implementing these in this one-day version
     
-    # If we're prioritizing goal-relevant actions, sort them
+    # If we're prioritizing goal-relevant actions, sort them by their integer
+    # priority; the sort is stable, so generation order is kept within a priority
     if prioritize_goals:
-        # Priority order: production > urgent > flight > return > move > low
-        action_priority = {
-            "produce": 0,    # Highest priority - directly contributes to production
-            "urgent": 1,     # High priority - bottleneck jigs
-            "flight": 2,     # Medium-high priority - needed for progress
-            "return": 3,     # Medium priority - frees up factory
-            "move": 4,       # Lower priority - general movement
-            "low": 5         # Lowest priority - potentially problematic
-        }
-        
-        # Sort by priority
-        all_actions.sort(key=lambda x: action_priority[x[1]])
-        
-        # Extract just the actions
-        return [action for action, _ in all_actions]
-    else:
-        # Return actions in original order
-        return [action for action, _ in all_actions]
+        all_actions.sort(key=itemgetter(1))
+    
+    # Extract just the actions
+    return [action for action, _ in all_actions]
 
 def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time_limit=60, 
                         heuristic_variant="standard", prioritize_actions=False,
                         use_forward_checking=True, use_random_restarts=False,
-                        random_restart_threshold=3000):
+                        random_restart_threshold=3000, local_search_workers=1, stats=None,
+                        heuristic_weight=1.0, event_sink=None, seed=None):
     """
     Perform hybrid A* search with CSP techniques to find the optimal plan.
     
@@ -170,6 +198,18 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
         use_forward_checking: Whether to use forward checking for domain reduction
         use_random_restarts: Whether to use random restarts to escape local minima
         random_restart_threshold: Number of iterations before considering a random restart
+        local_search_workers: Number of parallel processes for the final local search
+        stats: Optional dict that receives the best progress of the search
+               under 'best_progress', a {'flights', 'parts'} dict kept up to
+               date while the search runs
+        heuristic_weight: Weight w of the heuristic in the priority g + w * h;
+                          values above 1 trade plan length for fewer expansions
+        event_sink: Optional callable that receives a progress event dict
+                    ('iter', 'f', 'flights', 'parts', 'open') every 100
+                    iterations, where 'f' is the lowest priority left in
+                    the open set and 'open' its size
+        seed: Seed for the random restart choices and the local search; by
+              default the global random module is used
         
     Returns:
         List of actions forming the plan, or None if no plan found
@@ -178,41 +218,52 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
     start_time = time.time()
     
     # Initialize data structures
-    open_set = PriorityQueue()
-    open_set.put(initial_state, 0)
+    # Each distinct state is hashed once, when it is first reached, and is
+    # referred to by an integer id everywhere else in the search
+    state_ids = {initial_state: 0}  # Maps state -> state id
+    states = [initial_state]  # Maps state id -> state
+    cost_so_far = array('l', [0])  # Maps state id -> best known cost, stored unboxed
+    came_from = {}  # Maps state id -> (previous state id, action)
     
-    came_from = {}  # Maps state -> (previous_state, action)
-    cost_so_far = {initial_state: 0}
+    open_set = BucketPriorityQueue()
+    open_set.put(0, 0)
     
     iterations = 0
     states_explored = 0
     best_progress = {'flights': 0, 'parts': 0}
+    if stats is not None:
+        stats['best_progress'] = best_progress
     stagnation_counter = 0
     
-    # For randomized restarts
-    restart_states = []
+    # For randomized restarts: state ids in the order they were found, as
+    # the keys of a dict for constant-time membership tests
+    restart_states = {}
     
     # Initialize forward checker if enabled
     forward_checker = None
     if use_forward_checking:
         forward_checker = BelugaForwardChecker(initial_state, instance_data)
     
+    # Random source for the restart choices
+    rng = random if seed is None else random.Random(seed)
+    
     # Initialize local search if enabled
     local_search = None
     if use_random_restarts:
-        local_search = BelugaLocalSearch(instance_data)
+        local_search = BelugaLocalSearch(instance_data, seed=seed)
     
     # Main hybrid A* search loop
     while not open_set.is_empty() and iterations < max_iterations:
         iterations += 1
         
-        # Check time limit
-        if time.time() - start_time > time_limit:
+        # Check time limit, polling the clock only periodically
+        if (iterations & TIME_CHECK_MASK) == 0 and time.time() - start_time > time_limit:
             print(f"Time limit of {time_limit} seconds reached. Aborting search.")
             return None
         
         # Get the state with lowest estimated total cost
-        current_state = open_set.get()
+        current_id = open_set.get()
+        current_state = states[current_id]
         states_explored += 1
         
         # Check for goal state
@@ -222,7 +273,7 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
             print(f"Search time: {time.time() - start_time:.2f} seconds")
             
             # Reconstruct the plan
-            return reconstruct_plan(came_from, current_state)
+            return reconstruct_plan(came_from, current_id)
         
         # Check progress and print every 100 iterations
         if iterations % 100 == 0:
@@ -231,6 +282,14 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
             parts_progress = int(progress['parts_progress'].split('/')[0])
             
             print(f"Iteration {iterations}: Flights: {progress['flights_progress']}, Parts: {progress['parts_progress']}")
+            if event_sink is not None:
+                event_sink({
+                    "iter": iterations,
+                    "f": open_set.peek_priority(),
+                    "flights": flights_progress,
+                    "parts": parts_progress,
+                    "open": len(open_set)
+                })
             
             # Check if we're making progress
             if flights_progress > best_progress['flights'] or parts_progress > best_progress['parts']:
@@ -239,8 +298,11 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
                 stagnation_counter = 0
                 
                 # Save this state as a potential restart point
-                if use_random_restarts and current_state not in restart_states:
-                    restart_states.append(current_state)
+                if use_random_restarts and current_id not in restart_states:
+                    restart_states[current_id] = None
+                    # Keep only the most recent promising states
+                    if len(restart_states) > MAX_RESTART_STATES:
+                        del restart_states[next(iter(restart_states))]
             else:
                 stagnation_counter += 1
             
@@ -251,11 +313,11 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
                     print("Performing random restart from a promising state...")
                     
                     # Pick a random state from promising states
-                    restart_state = random.choice(restart_states)
+                    restart_id = rng.choice(list(restart_states))
                     
                     # Clear open set and start fresh from this state
-                    open_set = PriorityQueue()
-                    open_set.put(restart_state, 0)
+                    open_set = BucketPriorityQueue()
+                    open_set.put(restart_id, 0)
                     
                     # Reset stagnation counter
                     stagnation_counter = 0
@@ -265,58 +327,60 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
         
         # Update forward checker with current state if enabled
         if use_forward_checking:
-            forward_checker = BelugaForwardChecker(current_state, instance_data)
+            forward_checker.bind(current_state)
         
         # Generate all possible actions, possibly using forward checking
         actions = get_all_possible_actions(
             current_state, instance_data, prioritize_actions, forward_checker)
         
+        # Calculate cost once per expansion (uniform cost for every action)
+        new_cost = cost_so_far[current_id] + 1
+        
         # Explore each action
         for action in actions:
-            # Get resulting state
-            next_state = current_state.get_next_state(action, instance_data)
-            if next_state is None:
-                continue  # Invalid action/state
+            # Get resulting state; generated actions already passed is_valid_action
+            next_state = current_state.get_next_state(action, instance_data, validated=True)
+            
+            # If state is new or we found a better path (single hash lookup)
+            next_id = state_ids.get(next_state)
+            if next_id is None:
+                next_id = len(states)
+                state_ids[next_state] = next_id
+                states.append(next_state)
+                cost_so_far.append(new_cost)
+            elif new_cost < cost_so_far[next_id]:
+                cost_so_far[next_id] = new_cost
+            else:
+                continue
             
-            # Calculate cost
-            new_cost = cost_so_far[current_state] + 1  # Uniform cost
+            # Calculate heuristic - enhanced with forward checking
+            h_value = heuristic(next_state, instance_data, variant=heuristic_variant)
             
-            # If state is new or we found a better path
-            if next_state not in cost_so_far or new_cost < cost_so_far[next_state]:
-                cost_so_far[next_state] = new_cost
+            # Incorporate forward checking insights if enabled
+            if use_forward_checking:
+                forward_checker.bind(next_state)
+                success, heuristic_info = forward_checker.check_forward()
                 
-                # Calculate heuristic - enhanced with forward checking
-                h_value = heuristic(next_state, instance_data, variant=heuristic_variant)
+                # If forward checking reveals an inconsistency, increase heuristic
+                if not success:
+                    h_value += 10  # Significant penalty for inconsistent states
                 
-                # Incorporate forward checking insights if enabled
-                if use_forward_checking:
-                    fc = BelugaForwardChecker(next_state, instance_data)
-                    success, heuristic_info = fc.check_forward()
-                    
-                    # If forward checking reveals an inconsistency, increase heuristic
-                    if not success:
-                        h_value += 10  # Significant penalty for inconsistent states
-                    
-                    # Adjust heuristic based on domain sizes
-                    if 'domain_sizes' in heuristic_info and heuristic_info['domain_sizes']:
+                # Adjust heuristic based on domain sizes
+                if 'domain_sizes' in heuristic_info and heuristic_info['domain_sizes']:
+                    min_domain_size = heuristic_info['min_domain_size']
+                    if min_domain_size > 0:
                         # Add a small component based on domain restriction
-                        h_value += 0.1 * (1.0 / min(heuristic_info['domain_sizes'].values()))
-
-                    # Adjust heuristic based on domain sizes
-                    if 'domain_sizes' in heuristic_info and heuristic_info['domain_sizes']:
-                        # Add a safe check for empty domain_sizes dictionary
-                        if heuristic_info['domain_sizes'] and min(heuristic_info['domain_sizes'].values(), default=1) > 0:
-                            h_value += 0.1 * (1.0 / min(heuristic_info['domain_sizes'].values()))
-                        else:
-                            # Penalty for empty domains
-                            h_value += 10  # Same penalty as for inconsistent states
-                
-                # Calculate priority
-                priority = new_cost + h_value
-                
-                # Add to open set
-                open_set.put(next_state, priority)
-                came_from[next_state] = (current_state, action)
+                        h_value += 0.1 * (1.0 / min_domain_size)
+                    else:
+                        # Penalty for empty domains
+                        h_value += 10  # Same penalty as for inconsistent states
+            
+            # Calculate priority (weighted A*)
+            priority = new_cost + heuristic_weight * h_value
+            
+            # Add to open set
+            open_set.put(next_id, priority)
+            came_from[next_id] = (current_id, action)
     
     # If we got here, search failed
     print(f"Search failed after {iterations} iterations.")
@@ -326,24 +390,25 @@ def hybrid_astar_search(initial_state, instance_data, max_iterations=10000, time
     # If enabled, try local search as a last resort
     if use_random_restarts and local_search:
         print("Attempting local search as a final effort...")
-        local_plan = local_search.solve(initial_state, best_progress, instance_data, time_limit=max(5, time_limit/10))
+        local_plan = local_search.solve(initial_state, best_progress, instance_data, time_limit=max(5, time_limit/10),
+                                        workers=local_search_workers)
         if local_plan:
             print("Local search found a solution!")
             return local_plan
     
     return None
 
-def reconstruct_plan(came_from, goal_state):
+def reconstruct_plan(came_from, goal_id):
     """
-    Reconstruct the plan by working backwards from the goal state.
+    Reconstruct the plan by working backwards from the goal state id.
     """
     actions = []
-    current_state = goal_state
+    current_id = goal_id
     
-    while current_state in came_from:
-        previous_state, action = came_from[current_state]
+    while current_id in came_from:
+        previous_id, action = came_from[current_id]
         actions.append(action)
-        current_state = previous_state
+        current_id = previous_id
     
     # Reverse the list since we worked backwards
     actions.reverse()
@@ -0,0 +1,72 @@
+"""
+Precomputed lookups for a Beluga problem instance.
+The heuristics, forward checker and action generators evaluate these on every
+expanded node, so they are derived from the instance data once and shared.
+"""
+
+from itertools import chain
+from typing import Any, Dict, FrozenSet, List, Optional, Tuple
+
+class InstanceCache:
+    """Lookups derived from the problem instance that stay constant during search."""
+    
+    def __init__(self, instance_data):
+        """
+        Build the lookups for a problem instance.
+        
+        Args:
+            instance_data: Problem instance data
+        """
+        self.instance_data = instance_data
+        
+        # Production schedule over all lines, in line order, and as a set
+        self.production_schedule: Tuple[str, ...] = tuple(chain.from_iterable(
+            line.get('schedule', []) for line in instance_data.get('production_lines', [])))
+        self.production_schedule_set: FrozenSet[str] = frozenset(self.production_schedule)
+        
+        # Per-flight jig counts, plus outgoing_suffix[i] = total outgoing jigs
+        # of flights i and later (0 past the last flight)
+        flights = instance_data.get('flights', [])
+        self.num_flights = len(flights)
+        self.incoming_by_flight: Tuple[int, ...] = tuple(len(flight.get('incoming', [])) for flight in flights)
+        outgoing_suffix = [0] * (len(flights) + 1)
+        for i in range(len(flights) - 1, -1, -1):
+            outgoing_suffix[i] = outgoing_suffix[i + 1] + len(flights[i].get('outgoing', []))
+        self.outgoing_suffix: List[int] = outgoing_suffix
+        
+        # Rack sizes and per-jig sizes, flattening the jig -> jig type -> size lookups
+        self.rack_size: Dict[str, int] = {rack.get('name'): rack.get('size', 0)
+                                          for rack in instance_data.get('racks', [])}
+        jig_types = instance_data.get('jig_types', {})
+        self.size_loaded: Dict[str, int] = {}
+        self.size_empty: Dict[str, int] = {}
+        for jig_id, jig_data in instance_data.get('jigs', {}).items():
+            jig_type = jig_types[jig_data['type']]
+            self.size_loaded[jig_id] = jig_type['size_loaded']
+            self.size_empty[jig_id] = jig_type['size_empty']
+        
+        # Memoized heuristic values, keyed by (variant, state); filled and
+        # bounded by beluga_heuristic.heuristic
+        self.heuristic_values: Dict[Tuple[str, Any], float] = {}
+    
+    def remaining_outgoing(self, flight_idx: int) -> int:
+        """Return the number of outgoing jigs of flight flight_idx and later."""
+        return self.outgoing_suffix[min(flight_idx, self.num_flights)]
+
+# Cache for the most recently used instance; searches run on one instance at a time
+_instance_cache: Optional[InstanceCache] = None
+
+def get_instance_cache(instance_data) -> InstanceCache:
+    """
+    Return the lookups for a problem instance, building them on first use.
+    
+    Args:
+        instance_data: Problem instance data
+    
+    Returns:
+        InstanceCache for the instance
+    """
+    global _instance_cache
+    if _instance_cache is None or _instance_cache.instance_data is not instance_data:
+        _instance_cache = InstanceCache(instance_data)
+    return _instance_cache
\ No newline at end of file
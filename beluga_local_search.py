@@ -3,52 +3,123 @@ Local search implementation for the Beluga problem.
 Implements randomized local search to escape local minima.
 """
 
+import heapq
 import random
 import time
-import copy
-from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 
 from beluga_goal import is_goal_state, check_goal_progress
+from beluga_instance import get_instance_cache
 from beluga_actions import MoveJigBetweenRacks, LoadJigToBeluga, UnloadJigFromBeluga, SendJigToProduction, ReturnEmptyJigFromFactory, ProcessNextFlight
 
 class BelugaLocalSearch:
     """Implements a randomized local search for the Beluga problem."""
     
-    def __init__(self, instance_data):
+    def __init__(self, instance_data, seed=None):
         """
         Initialize the local search.
         
         Args:
             instance_data: Problem instance data
+            seed: Seed for a private random generator; by default the global
+                  random module is used, so seeding it reproduces the search
         """
         self.instance_data = instance_data
+        self._rng = random if seed is None else random.Random(seed)
         
-    def solve(self, initial_state, best_progress, instance_data, time_limit=30, max_iterations=5000):
+        # Scores of the states seen by the current search, so that a state
+        # reached again from another parent is not scored again
+        self._score_cache = {}
+        
+        # Loaded scheduled jig counts of the states seen by the current
+        # search, derived from the parent's counts when a state is expanded
+        self._loaded_counts = {}
+        
+    def solve(self, initial_state, best_progress, instance_data, time_limit=30, max_iterations=5000,
+              beam_width=100, workers=1):
         """
         Attempt to find a solution using randomized local search.
         
+        The search is best-first over a bounded beam: states are expanded
+        in order of their score, and only the beam_width best unexpanded
+        states are kept. With several workers, independent searches with
+        different random seeds run in parallel processes and the best
+        result is kept.
+        
         Args:
             initial_state: Initial state to start from
             best_progress: Dict with best progress made so far
             instance_data: Problem instance data
             time_limit: Time limit in seconds
             max_iterations: Maximum iterations
+            beam_width: Maximum number of states waiting to be explored
+            workers: Number of parallel worker processes
             
         Returns:
             List of actions forming the plan, or None if no plan found
         """
+        if workers > 1:
+            return self._solve_parallel(initial_state, instance_data, time_limit, max_iterations,
+                                        beam_width, workers)
+        
+        _, _, plan = self._search(initial_state, instance_data, time_limit, max_iterations, beam_width)
+        return plan
+    
+    def _solve_parallel(self, initial_state, instance_data, time_limit, max_iterations, beam_width, workers):
+        """
+        Run independent local searches in worker processes.
+        
+        The searches differ only by the random seed used to sample actions,
+        so they explore different parts of the state space without sharing
+        a frontier. Seeds are drawn from this search's random generator,
+        which keeps seeded runs reproducible.
+        
+        Returns:
+            Plan of a search that reached the goal, otherwise the plan of the
+            search with the best score, or None if no plan found
+        """
+        print(f"Running {workers} local searches in parallel...")
+        seeds = [self._rng.getrandbits(32) for _ in range(workers)]
+        
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_search_worker, instance_data, initial_state, time_limit,
+                                       max_iterations, beam_width, seed)
+                       for seed in seeds]
+            results = [future.result() for future in futures]
+        
+        # Prefer a search that reached the goal, then the best score
+        _, _, plan = max(results, key=lambda result: (result[0], result[1]))
+        return plan
+    
+    def _search(self, initial_state, instance_data, time_limit, max_iterations, beam_width):
+        """
+        Run one best-first beam search.
+        
+        Returns:
+            Tuple of (goal_reached, best_score, plan), where plan is None if
+            no plan found
+        """
         print(f"Starting local search with time limit {time_limit}s and {max_iterations} iterations...")
         start_time = time.time()
         
+        # Scores from an earlier search may belong to another instance
+        self._score_cache.clear()
+        self._loaded_counts.clear()
+        
         # Keep track of the best state found so far
         best_state = initial_state
         best_score = self._evaluate_state(best_state, instance_data)
         
-        # Keep track of the path to the best state
-        best_path = []
+        # Keep track of the path to the best state; paths are persistent
+        # linked lists of (action, parent path) pairs, with None as the
+        # empty path, so extending a path never copies it
+        best_path = None
         
-        # Create a queue of states to explore
-        states_to_explore = deque([(initial_state, [])])  # (state, path)
+        # Heap of states to explore, best score first; each state is scored
+        # once, when it is added, and the entry count breaks ties in FIFO
+        # order so states themselves are never compared
+        states_to_explore = [(-best_score, 0, initial_state, None)]  # (-score, entry, state, path)
+        entry_count = 1
         
         # Track visited states to avoid cycles
         visited_states = set()
@@ -62,8 +133,8 @@ class BelugaLocalSearch:
                 print(f"Local search time limit reached after {iterations} iterations.")
                 break
             
-            # Get next state to explore
-            current_state, path_so_far = states_to_explore.popleft()
+            # Get the most promising state to explore
+            neg_score, _, current_state, path_so_far = heapq.heappop(states_to_explore)
             
             # Skip if already visited
             if current_state in visited_states:
@@ -74,10 +145,10 @@ class BelugaLocalSearch:
             # Check if this is a goal state
             if is_goal_state(current_state, instance_data):
                 print(f"Local search found a solution after {iterations} iterations!")
-                return path_so_far
+                return True, -neg_score, path_to_plan(path_so_far)
             
-            # Evaluate current state
-            current_score = self._evaluate_state(current_state, instance_data)
+            # Score computed when the state was added
+            current_score = -neg_score
             
             # Update best state if this is better
             if current_score > best_score:
@@ -89,24 +160,39 @@ class BelugaLocalSearch:
                 progress = check_goal_progress(current_state, instance_data)
                 print(f"Progress: Flights: {progress['flights_progress']}, Parts: {progress['parts_progress']}")
             
+            # Prune states that cannot lead to a better score; the best score
+            # may have risen since the state was added
+            if self._upper_bound(current_state, instance_data) <= best_score:
+                continue
+            
             # Generate possible moves
             possible_actions = self._get_random_actions(current_state, instance_data)
             
             # Add promising states to explore
             for action in possible_actions:
-                next_state = current_state.get_next_state(action, instance_data)
+                # Sampled actions have already passed is_valid_action
+                next_state = self._expand(current_state, action, instance_data)
                 if next_state and next_state not in visited_states:
-                    # Create a copy of the path and add this action
-                    new_path = path_so_far.copy()
-                    new_path.append(action)
+                    # Skip states that cannot lead to a better score
+                    if self._upper_bound(next_state, instance_data) <= best_score:
+                        continue
                     
-                    # Add to exploration queue
-                    states_to_explore.append((next_state, new_path))
+                    # Extend the path with this action, sharing its parent
+                    new_path = (action, path_so_far)
+                    
+                    # Add to exploration heap
+                    next_score = self._evaluate_state(next_state, instance_data)
+                    heapq.heappush(states_to_explore, (-next_score, entry_count, next_state, new_path))
+                    entry_count += 1
+            
+            # Keep only the best states within the beam (a sorted list is a valid heap)
+            if len(states_to_explore) > beam_width:
+                states_to_explore = heapq.nsmallest(beam_width, states_to_explore)
         
         print(f"Local search completed with best score {best_score} after {iterations} iterations.")
-        if best_path:
-            return best_path
-        return None
+        if best_path is not None:
+            return False, best_score, path_to_plan(best_path)
+        return False, best_score, None
     
     def _evaluate_state(self, state, instance_data):
         """
@@ -119,16 +205,16 @@ class BelugaLocalSearch:
         Returns:
             Score value (higher is better)
         """
-        score = 0
+        score = self._score_cache.get(state)
+        if score is not None:
+            return score
         
-        # Get progress information
-        progress = check_goal_progress(state, instance_data)
-        
-        # Extract progress values
-        flights_processed = int(progress['flights_processed'])
-        total_flights = int(progress['total_flights'])
-        parts_produced = int(progress['parts_produced'])
-        total_parts = int(progress['total_parts'])
+        # Progress values, as check_goal_progress reports them; the parts
+        # total is the number of schedule entries whose jig is still loaded
+        flights_processed = state.current_flight_idx
+        total_flights = get_instance_cache(instance_data).num_flights
+        parts_produced = len(state.produced_parts)
+        total_parts = self._get_loaded_counts(state, instance_data)[1]
         
         # Calculate score components
         flight_score = 100 * (flights_processed / total_flights if total_flights > 0 else 0)
@@ -140,8 +226,105 @@ class BelugaLocalSearch:
         # Add bonus for completed flights and parts
         score += 50 * flights_processed + 100 * parts_produced
         
+        self._score_cache[state] = score
         return score
     
+    def _get_loaded_counts(self, state, instance_data):
+        """
+        Count the scheduled jigs of a state that are still loaded.
+        
+        Args:
+            state: State to count for
+            instance_data: Problem instance data
+            
+        Returns:
+            Tuple of the number of distinct loaded scheduled jigs and the
+            number of production schedule entries they account for
+        """
+        counts = self._loaded_counts.get(state)
+        if counts is not None:
+            return counts
+        
+        loaded_jigs = set()
+        loaded_parts = 0
+        for jig_id in get_instance_cache(instance_data).production_schedule:
+            loaded, part_id = state.jig_status.get(jig_id, (False, ""))
+            if loaded and part_id:
+                loaded_jigs.add(jig_id)
+                loaded_parts += 1
+        
+        counts = (len(loaded_jigs), loaded_parts)
+        self._loaded_counts[state] = counts
+        return counts
+    
+    def _expand(self, state, action, instance_data):
+        """
+        Apply a sampled action and derive the loaded counts of the result.
+        
+        Only a production step changes a jig's load, so the counts follow
+        from the parent's counts and the action instead of a new scan.
+        
+        Args:
+            state: State to expand
+            action: Action that passed is_valid_action in the state
+            instance_data: Problem instance data
+            
+        Returns:
+            The resulting state
+        """
+        next_state = state.get_next_state(action, instance_data, validated=True)
+        if next_state not in self._loaded_counts:
+            loaded_jigs, loaded_parts = self._get_loaded_counts(state, instance_data)
+            if isinstance(action, SendJigToProduction):
+                loaded, part_id = state.jig_status[action.jig_id]
+                if loaded and part_id:
+                    entries = get_instance_cache(instance_data).production_schedule.count(action.jig_id)
+                    if entries:
+                        loaded_jigs -= 1
+                        loaded_parts -= entries
+            self._loaded_counts[next_state] = (loaded_jigs, loaded_parts)
+        return next_state
+    
+    def _upper_bound(self, state, instance_data):
+        """
+        Optimistic bound on the score of any state reachable from a state.
+        
+        Local search never processes the last flight, and each production
+        step produces one more part and leaves one fewer loaded scheduled
+        jig, which is the total _evaluate_state divides by. While some
+        scheduled jig is still loaded, the parts ratio is therefore at most
+        the number of parts produced.
+        
+        Args:
+            state: State to bound
+            instance_data: Problem instance data
+            
+        Returns:
+            Upper bound on _evaluate_state over the reachable states, or
+            infinity when all flights are processed and the goal may still
+            be reachable
+        """
+        cache = get_instance_cache(instance_data)
+        total_flights = cache.num_flights
+        if state.current_flight_idx >= total_flights:
+            return float('inf')
+        
+        # Flight components at the last flight local search can reach
+        flights = max(state.current_flight_idx, total_flights - 1)
+        bound = 100 * flights / total_flights + 50 * flights
+        
+        # Parts components with every loaded scheduled jig produced, or with
+        # all but one produced and that one left as the ratio's denominator
+        produced = len(state.produced_parts)
+        loaded_jigs = self._get_loaded_counts(state, instance_data)[0]
+        if loaded_jigs:
+            max_produced = produced + loaded_jigs
+            bound += max(100 * max_produced, 300 * (max_produced - 1))
+        else:
+            bound += 100 * produced
+        
+        return bound
+    
     def _get_random_actions(self, state, instance_data, num_actions=5):
         """
         Get a random sample of possible actions.
@@ -154,29 +337,54 @@ class BelugaLocalSearch:
         Returns:
             List of possible actions
         """
-        all_actions = []
+        cache = get_instance_cache(instance_data)
+        rng = self._rng
+        
+        # The possible actions are never collected: each one is offered to a
+        # reservoir of its type as it is generated (Algorithm R), which keeps
+        # a uniform sample of at most num_actions actions of that type
+        reservoirs = {
+            MoveJigBetweenRacks: [],
+            SendJigToProduction: [],
+            ReturnEmptyJigFromFactory: [],
+            ProcessNextFlight: []
+        }
+        counts = dict.fromkeys(reservoirs, 0)
+        capacity = max(num_actions, 1)
+        
+        def offer(action):
+            action_type = type(action)
+            counts[action_type] += 1
+            reservoir = reservoirs[action_type]
+            if len(reservoir) < capacity:
+                reservoir.append(action)
+            else:
+                j = rng.randrange(counts[action_type])
+                if j < capacity:
+                    reservoir[j] = action
         
         # 1. Generate MoveJigBetweenRacks actions
+        # Free space is computed once per rack, so each candidate move is a
+        # single size comparison instead of a full is_valid_action occupancy
+        # scan; edge jigs are valid sources by construction
+        rack_ids = tuple(state.rack_jigs)
+        free_space = {rack_id: state.get_rack_free_space(rack_id, instance_data) for rack_id in rack_ids}
         for from_rack_id, jigs in state.rack_jigs.items():
             if not jigs:
                 continue
             
-            # Check jigs at the edges
-            for jig_id in [jigs[0], jigs[-1]] if len(jigs) > 0 else []:
-                if jig_id not in jigs:
-                    continue  # Skip if jig not found (shouldn't happen)
+            # Check jigs at the edges (a single jig is both edges, so only once)
+            edge_jigs = (jigs[0],) if len(jigs) == 1 else (jigs[0], jigs[-1])
+            for jig_id in edge_jigs:
+                jig_size = state.get_jig_size(jig_id, instance_data)
                 
-                # Try moving to each other rack
-                for to_rack_id in state.rack_jigs.keys():
-                    if from_rack_id != to_rack_id:
-                        action = MoveJigBetweenRacks(jig_id, from_rack_id, to_rack_id)
-                        if state.is_valid_action(action, instance_data):
-                            all_actions.append(action)
+                # Try moving to each other rack that can fit the jig
+                for to_rack_id in rack_ids:
+                    if from_rack_id != to_rack_id and jig_size <= free_space[to_rack_id]:
+                        offer(MoveJigBetweenRacks(jig_id, from_rack_id, to_rack_id))
         
         # 2. Generate SendJigToProduction actions
-        production_schedule = []
-        for line in instance_data.get('production_lines', []):
-            production_schedule.extend(line.get('schedule', []))
+        production_schedule = cache.production_schedule_set
         
         for rack_id, jigs in state.rack_jigs.items():
             if not jigs:
@@ -191,7 +399,7 @@ class BelugaLocalSearch:
                 if jig_id in production_schedule and loaded:
                     action = SendJigToProduction(jig_id, rack_id)
                     if state.is_valid_action(action, instance_data):
-                        all_actions.append(action)
+                        offer(action)
         
         # 3. Generate ReturnEmptyJigFromFactory actions
         for jig_id in state.factory_jigs:
@@ -199,42 +407,64 @@ class BelugaLocalSearch:
             loaded, _ = state.jig_status.get(jig_id, (False, ""))
             if not loaded:
                 # Try returning to each rack
-                for rack_id in state.rack_jigs.keys():
+                for rack_id in rack_ids:
                     action = ReturnEmptyJigFromFactory(jig_id, rack_id)
                     if state.is_valid_action(action, instance_data):
-                        all_actions.append(action)
+                        offer(action)
         
         # 4. Generate ProcessNextFlight action if not at the last flight
-        if state.current_flight_idx < len(instance_data.get('flights', [])) - 1:
+        if state.current_flight_idx < cache.num_flights - 1:
             action = ProcessNextFlight()
             if state.is_valid_action(action, instance_data):
-                all_actions.append(action)
+                offer(action)
         
         # Randomly sample actions, ensuring at least one of each type if possible
         selected_actions = []
         
-        # First, categorize actions by type
-        actions_by_type = {
-            "move": [a for a in all_actions if isinstance(a, MoveJigBetweenRacks)],
-            "produce": [a for a in all_actions if isinstance(a, SendJigToProduction)],
-            "return": [a for a in all_actions if isinstance(a, ReturnEmptyJigFromFactory)],
-            "flight": [a for a in all_actions if isinstance(a, ProcessNextFlight)]
-        }
-        
-        # Try to include one of each type
-        for action_type in actions_by_type:
-            if actions_by_type[action_type]:
-                selected_actions.append(random.choice(actions_by_type[action_type]))
+        # A shuffled reservoir is a random ordering of a uniform sample, so
+        # its first action is a uniform pick of its type
+        for reservoir in reservoirs.values():
+            if reservoir:
+                rng.shuffle(reservoir)
+                selected_actions.append(reservoir[0])
         
-        # Fill remaining slots with random actions
-        remaining_actions = [a for a in all_actions if a not in selected_actions]
+        # Fill remaining slots with random actions: each slot draws a type in
+        # proportion to its actions not yet selected, then takes the next
+        # action of that type's reservoir, which samples the unselected
+        # actions uniformly without replacement
+        unselected = {action_type: count - 1 for action_type, count in counts.items() if count}
+        taken = dict.fromkeys(unselected, 1)
         remaining_slots = num_actions - len(selected_actions)
+        total_unselected = sum(unselected.values())
         
-        if remaining_actions and remaining_slots > 0:
-            # Randomly select remaining actions
-            selected_actions.extend(random.sample(
-                remaining_actions, 
-                min(remaining_slots, len(remaining_actions))
-            ))
+        while remaining_slots > 0 and total_unselected > 0:
+            j = rng.randrange(total_unselected)
+            for action_type, count in unselected.items():
+                if j < count:
+                    break
+                j -= count
+            selected_actions.append(reservoirs[action_type][taken[action_type]])
+            taken[action_type] += 1
+            unselected[action_type] -= 1
+            total_unselected -= 1
+            remaining_slots -= 1
         
-        return selected_actions
\ No newline at end of file
+        return selected_actions
+
+def path_to_plan(path):
+    """
+    Turn a persistent (action, parent path) linked list into a list of actions.
+    """
+    actions = []
+    while path is not None:
+        action, path = path
+        actions.append(action)
+    
+    # Reverse the list since we walked from the last action back
+    actions.reverse()
+    return actions
+
+def _run_search_worker(instance_data, initial_state, time_limit, max_iterations, beam_width, seed):
+    """Run one local search in a worker process with its own random seed."""
+    local_search = BelugaLocalSearch(instance_data, seed=seed)
+    return local_search._search(initial_state, instance_data, time_limit, max_iterations, beam_width)
\ No newline at end of file
@@ -26,53 +26,77 @@ class BelugaState:
     # Optional metadata for tracking
     metadata: Dict[str, Any] = field(default_factory=dict)
     
+    # Reverse index - mapping of jig_name to its location; derived from the
+    # components above, so it is built when not given and never compared
+    jig_location: Dict[str, str] = field(default=None, compare=False, repr=False)
+    
     def __post_init__(self):
-        """Validate the state after initialization."""
-        # No validation for now to keep it simple
-        pass
+        """Build the canonical key, hash and jig location index of the state once."""
+        if self.jig_location is None:
+            object.__setattr__(self, 'jig_location', self._build_jig_location())
+        
+        # The state is immutable, so its canonical form (all components
+        # except metadata) and its hash are computed once at construction
+        # instead of on every dict/set lookup during search
+        key = (
+            tuple(sorted(self.rack_jigs.items())),
+            tuple(sorted(self.jig_status.items())),
+            self.beluga_jigs,
+            self.factory_jigs,
+            self.produced_parts,
+            self.current_flight_idx
+        )
+        object.__setattr__(self, '_key', key)
+        object.__setattr__(self, '_hash', hash(key))
     
     def __eq__(self, other):
         """Check if two states are equal."""
         if not isinstance(other, BelugaState):
             return False
         
-        # Compare all relevant state components
-        return (self.rack_jigs == other.rack_jigs and
-                self.jig_status == other.jig_status and
-                self.beluga_jigs == other.beluga_jigs and
-                self.factory_jigs == other.factory_jigs and
-                self.produced_parts == other.produced_parts and
-                self.current_flight_idx == other.current_flight_idx)
+        # Compare cached hashes first, then all relevant state components
+        return self._hash == other._hash and self._key == other._key
     
     def __hash__(self):
-        """Generate a hash for the state for use in sets and dictionaries."""
-        # Combine hashes of all immutable components
-        components = (
-            hash(tuple(sorted([(k, v) for k, v in self.rack_jigs.items()]))),
-            hash(tuple(sorted([(k, v) for k, v in self.jig_status.items()]))),
-            hash(self.beluga_jigs),
-            hash(self.factory_jigs),
-            hash(self.produced_parts),
-            hash(self.current_flight_idx)
-        )
-        return hash(components)
+        """Return the cached hash of the state for use in sets and dictionaries."""
+        return self._hash
+    
+    def __reduce__(self):
+        """Pickle through the constructor, so the cached hash is recomputed by the receiving process."""
+        return (BelugaState, (self.rack_jigs, self.jig_status, self.beluga_jigs, self.factory_jigs,
+                              self.produced_parts, self.current_flight_idx, self.metadata))
+    
+    def _build_jig_location(self):
+        """Map every jig to its location with one pass over the state."""
+        jig_location = {}
+        # Beluga takes precedence over factory, which takes precedence over racks
+        for jig_id in self.beluga_jigs:
+            jig_location[jig_id] = "beluga"
+        for jig_id in self.factory_jigs:
+            jig_location.setdefault(jig_id, "factory")
+        for rack_id, jigs in self.rack_jigs.items():
+            for jig_id in jigs:
+                jig_location.setdefault(jig_id, rack_id)
+        return jig_location
     
     def get_jig_location(self, jig_id):
         """Return the location of a jig (rack_name, beluga, factory, or None)."""
-        # Check if in Beluga
-        if jig_id in self.beluga_jigs:
-            return "beluga"
-        
-        # Check if in factory
-        if jig_id in self.factory_jigs:
-            return "factory"
-        
-        # Check if in a rack
-        for rack_id, jigs in self.rack_jigs.items():
-            if jig_id in jigs:
-                return rack_id
-        
-        return None
+        return self.jig_location.get(jig_id)
+    
+    @property
+    def jig_positions(self):
+        """Map every jig stored in a rack to (rack_name, index in the rack)."""
+        # Built on first access only, since most states are never asked for
+        # positions; states are immutable, so the map never goes stale
+        jig_positions = self.__dict__.get('_jig_positions')
+        if jig_positions is None:
+            jig_positions = {}
+            for rack_id, jigs in self.rack_jigs.items():
+                for i, jig_id in enumerate(jigs):
+                    if jig_id not in jig_positions and self.jig_location[jig_id] == rack_id:
+                        jig_positions[jig_id] = (rack_id, i)
+            object.__setattr__(self, '_jig_positions', jig_positions)
+        return jig_positions
     
     def jig_is_at_rack_edge(self, rack_id, jig_id, instance_data):
         """Check if a jig is at an edge of a rack."""
@@ -88,6 +112,30 @@ class BelugaState:
         
         return False
     
+    def get_jig_size(self, jig_id, instance_data):
+        """Return the current size of a jig, depending on whether it is loaded."""
+        jig_type = instance_data['jigs'][jig_id]['type']
+        loaded, _ = self.jig_status.get(jig_id, (False, ""))
+        if loaded:
+            return instance_data['jig_types'][jig_type]['size_loaded']
+        return instance_data['jig_types'][jig_type]['size_empty']
+    
+    def get_rack_free_space(self, rack_id, instance_data):
+        """Return the space left in a rack given the jigs it currently holds."""
+        # Find rack size
+        rack_size = 0
+        for rack in instance_data.get('racks', []):
+            if rack.get('name') == rack_id:
+                rack_size = rack.get('size', 0)
+                break
+        
+        # Subtract the current occupancy of the rack
+        current_occupancy = 0
+        for jig_id in self.rack_jigs.get(rack_id, ()):
+            current_occupancy += self.get_jig_size(jig_id, instance_data)
+        
+        return rack_size - current_occupancy
+    
     def is_valid_action(self, action, instance_data):
         """Check if an action is valid in the current state."""
         # Import here to avoid circular imports
@@ -103,41 +151,9 @@ class BelugaState:
             if not self.jig_is_at_rack_edge(action.from_rack_id, action.jig_id, instance_data):
                 return False
             
-            # Check if destination rack has space
-            # Find rack size
-            rack_size = 0
-            for rack in instance_data.get('racks', []):
-                if rack.get('name') == action.to_rack_id:
-                    rack_size = rack.get('size', 0)
-                    break
-            
-            # Calculate current occupancy of the destination rack
-            current_occupancy = 0
-            for jig_id in self.rack_jigs.get(action.to_rack_id, ()):
-                # Get the jig type
-                jig_type = instance_data['jigs'][jig_id]['type']
-                
-                # Determine if jig is loaded or empty
-                loaded, _ = self.jig_status.get(jig_id, (False, ""))
-                
-                # Get the size from jig_types
-                if loaded:
-                    jig_size = instance_data['jig_types'][jig_type]['size_loaded']
-                else:
-                    jig_size = instance_data['jig_types'][jig_type]['size_empty']
-                
-                current_occupancy += jig_size
-            
-            # Get size of the jig to be moved
-            jig_type = instance_data['jigs'][action.jig_id]['type']
-            loaded, _ = self.jig_status.get(action.jig_id, (False, ""))
-            if loaded:
-                moving_jig_size = instance_data['jig_types'][jig_type]['size_loaded']
-            else:
-                moving_jig_size = instance_data['jig_types'][jig_type]['size_empty']
-            
-            # Check if there's enough space
-            if current_occupancy + moving_jig_size > rack_size:
+            # Check if destination rack has enough space for the jig
+            moving_jig_size = self.get_jig_size(action.jig_id, instance_data)
+            if moving_jig_size > self.get_rack_free_space(action.to_rack_id, instance_data):
                 return False
             
             return True
@@ -146,62 +162,81 @@ class BelugaState:
         # For simplicity, we'll assume other actions are valid
         return True
     
-    def get_next_state(self, action, instance_data):
-        """Apply an action to get the next state."""
+    def get_next_state(self, action, instance_data, validated=False):
+        """
+        Apply an action to get the next state.
+        
+        Returns None for an invalid action, unless validated is True, in which
+        case the caller guarantees the action passed is_valid_action and the
+        check is skipped.
+        """
         # Import here to avoid circular imports
         from beluga_actions import MoveJigBetweenRacks, LoadJigToBeluga, UnloadJigFromBeluga, SendJigToProduction, ReturnEmptyJigFromFactory, ProcessNextFlight
         
-        if not self.is_valid_action(action, instance_data):
+        if not validated and not self.is_valid_action(action, instance_data):
             return None
         
-        # Create mutable copies of state components
-        rack_jigs = {k: list(v) for k, v in self.rack_jigs.items()}
-        jig_status = dict(self.jig_status)
-        beluga_jigs = set(self.beluga_jigs)
-        factory_jigs = set(self.factory_jigs)
-        produced_parts = set(self.produced_parts)
+        # Components are copied on write: the new state shares every rack
+        # tuple, set and index the action leaves unchanged with this state,
+        # which is safe since states are never mutated
+        rack_jigs = self.rack_jigs
+        jig_status = self.jig_status
+        beluga_jigs = self.beluga_jigs
+        factory_jigs = self.factory_jigs
+        produced_parts = self.produced_parts
         current_flight_idx = self.current_flight_idx
+        jig_location = self.jig_location
         
         # MoveJigBetweenRacks
         if isinstance(action, MoveJigBetweenRacks):
+            rack_jigs = dict(rack_jigs)
             # Remove jig from source rack
-            rack_jigs[action.from_rack_id].remove(action.jig_id)
+            rack_jigs[action.from_rack_id] = _without_jig(rack_jigs[action.from_rack_id], action.jig_id)
             # Add jig to destination rack
-            rack_jigs[action.to_rack_id].append(action.jig_id)
+            rack_jigs[action.to_rack_id] = rack_jigs[action.to_rack_id] + (action.jig_id,)
+            jig_location = {**jig_location, action.jig_id: action.to_rack_id}
         
         # LoadJigToBeluga
         elif isinstance(action, LoadJigToBeluga):
+            rack_jigs = dict(rack_jigs)
             # Remove jig from source rack
-            rack_jigs[action.from_rack_id].remove(action.jig_id)
+            rack_jigs[action.from_rack_id] = _without_jig(rack_jigs[action.from_rack_id], action.jig_id)
             # Add jig to Beluga
-            beluga_jigs.add(action.jig_id)
+            beluga_jigs = beluga_jigs | {action.jig_id}
+            jig_location = {**jig_location, action.jig_id: "beluga"}
         
         # UnloadJigFromBeluga
         elif isinstance(action, UnloadJigFromBeluga):
             # Remove jig from Beluga
-            beluga_jigs.remove(action.jig_id)
+            beluga_jigs = beluga_jigs - {action.jig_id}
             # Add jig to destination rack
-            rack_jigs[action.to_rack_id].append(action.jig_id)
+            rack_jigs = dict(rack_jigs)
+            rack_jigs[action.to_rack_id] = rack_jigs[action.to_rack_id] + (action.jig_id,)
+            jig_location = {**jig_location, action.jig_id: action.to_rack_id}
         
         # SendJigToProduction
         elif isinstance(action, SendJigToProduction):
+            rack_jigs = dict(rack_jigs)
             # Remove jig from source rack
-            rack_jigs[action.from_rack_id].remove(action.jig_id)
+            rack_jigs[action.from_rack_id] = _without_jig(rack_jigs[action.from_rack_id], action.jig_id)
             # Add jig to factory
-            factory_jigs.add(action.jig_id)
+            factory_jigs = factory_jigs | {action.jig_id}
+            jig_location = {**jig_location, action.jig_id: "factory"}
             # Mark part as produced
             loaded, part_id = jig_status[action.jig_id]
             if loaded and part_id:
-                produced_parts.add(part_id)
+                produced_parts = produced_parts | {part_id}
                 # Update jig status to empty
-                jig_status[action.jig_id] = (False, "")
+                jig_status = {**jig_status, action.jig_id: (False, "")}
         
         # ReturnEmptyJigFromFactory
         elif isinstance(action, ReturnEmptyJigFromFactory):
             # Remove jig from factory
-            factory_jigs.remove(action.jig_id)
+            factory_jigs = factory_jigs - {action.jig_id}
             # Add jig to destination rack
-            rack_jigs[action.to_rack_id].append(action.jig_id)
+            rack_jigs = dict(rack_jigs)
+            rack_jigs[action.to_rack_id] = rack_jigs[action.to_rack_id] + (action.jig_id,)
+            jig_location = {**jig_location, action.jig_id: action.to_rack_id}
         
         # ProcessNextFlight
         elif isinstance(action, ProcessNextFlight):
@@ -214,21 +249,21 @@ class BelugaState:
                 # Note: In a complete implementation, we would handle the incoming jigs here
                 # But for simplicity in this one-day implementation, we'll assume they're handled separately
         
-        # Convert mutable collections back to immutable
-        rack_jigs = {k: tuple(v) for k, v in rack_jigs.items()}
-        beluga_jigs = frozenset(beluga_jigs)
-        factory_jigs = frozenset(factory_jigs)
-        produced_parts = frozenset(produced_parts)
-        
         return BelugaState(
             rack_jigs=rack_jigs,
             jig_status=jig_status,
             beluga_jigs=beluga_jigs,
             factory_jigs=factory_jigs,
             produced_parts=produced_parts,
-            current_flight_idx=current_flight_idx
+            current_flight_idx=current_flight_idx,
+            jig_location=jig_location
         )
     
+def _without_jig(jigs, jig_id):
+    """Return a rack's jig tuple without the first occurrence of a jig."""
+    i = jigs.index(jig_id)
+    return jigs[:i] + jigs[i + 1:]
+
 def create_initial_state(instance_data):
     """Create the initial state from the problem instance data."""
     
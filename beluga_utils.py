@@ -1,3 +1,8 @@
+from functools import lru_cache
+
+# Actions are frozen dataclasses, so equal actions share one rendering;
+# plans repeat the same moves and production steps
+@lru_cache(maxsize=4096)
 def action_to_string(action):
     """Convert an action to a human-readable string."""
     from beluga_actions import MoveJigBetweenRacks, LoadJigToBeluga, UnloadJigFromBeluga, SendJigToProduction, ReturnEmptyJigFromFactory, ProcessNextFlight
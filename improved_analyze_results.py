@@ -1,10 +1,73 @@
 import os
 import json
 import pandas as pd
+import matplotlib
+matplotlib.use("Agg")  # Figures are only saved to files, never shown
 import matplotlib.pyplot as plt
 import seaborn as sns
 import numpy as np
 
+# Metrics averaged per group in the heuristic and prioritization comparisons
+COMPARISON_METRICS = {
+    "Success": "mean",
+    "Iterations": "mean",
+    "SearchTime": "mean",
+    "TotalTime": "mean"
+}
+
+# Column types of the summary CSV, so read_csv skips type inference;
+# Experiment stays a plain string column to keep the plots in run order
+SUMMARY_DTYPES = {
+    "Experiment": str,
+    "Heuristic": str,
+    "Prioritize": bool,
+    "Iterations": "int32",
+    "Success": bool,
+    "PlanLength": "int32",
+    "SearchTime": "float64",
+    "TotalTime": "float64"
+}
+
+# Heatmap bin edges: 0-6 flights and 0-13 parts
+FLIGHT_BINS = np.arange(0, 7)
+PART_BINS = np.arange(0, 14)
+
+def progress_histogram(flights, parts):
+    """
+    Count progress samples per (flights, parts) cell of the heatmap bins.
+    
+    Equivalent to np.histogram2d over FLIGHT_BINS and PART_BINS, but as a
+    single np.bincount over combined cell indices. As in histogram2d, the
+    last bin includes its upper edge and samples outside the bins are
+    dropped.
+    """
+    n_flight_bins = len(FLIGHT_BINS) - 1
+    n_part_bins = len(PART_BINS) - 1
+    flights = np.asarray(flights, dtype=np.int64)
+    parts = np.asarray(parts, dtype=np.int64)
+    
+    in_range = ((flights >= FLIGHT_BINS[0]) & (flights <= FLIGHT_BINS[-1]) &
+                (parts >= PART_BINS[0]) & (parts <= PART_BINS[-1]))
+    flight_idx = np.minimum(flights[in_range] - FLIGHT_BINS[0], n_flight_bins - 1)
+    part_idx = np.minimum(parts[in_range] - PART_BINS[0], n_part_bins - 1)
+    
+    counts = np.bincount(flight_idx * n_part_bins + part_idx, minlength=n_flight_bins * n_part_bins)
+    return counts.reshape(n_flight_bins, n_part_bins).astype(float)
+
+def compare_by(summary, column):
+    """
+    Average the experiment metrics for each value of a summary column.
+    
+    Only built-in aggregations are used so pandas stays on its fast
+    groupby path. The mean plan length is taken over successful runs
+    (PlanLength > 0) only and is 0 for groups without any.
+    """
+    comparison = summary.groupby(column).agg(COMPARISON_METRICS)
+    successful = summary[summary["PlanLength"] > 0]
+    plan_length = successful.groupby(column)["PlanLength"].mean()
+    comparison["PlanLength"] = plan_length.reindex(comparison.index).fillna(0)
+    return comparison
+
 # Get the latest results directory
 results_dir = "improved_experiment_results"
 run_dirs = [os.path.join(results_dir, d) for d in os.listdir(results_dir) if d.startswith("run_")]
@@ -19,7 +82,7 @@ print(f"Analyzing improved results from: {latest_run}")
 
 # Read the summary file
 summary_file = os.path.join(latest_run, "summary.csv")
-summary = pd.read_csv(summary_file)
+summary = pd.read_csv(summary_file, dtype=SUMMARY_DTYPES)
 
 # Calculate success rate
 success_rate = summary["Success"].mean() * 100
@@ -40,6 +103,7 @@ plt.title("Number of Iterations by Experiment")
 plt.xticks(rotation=45, ha="right")
 plt.tight_layout()
 plt.savefig(os.path.join(report_dir, "iterations_comparison.png"))
+plt.close()
 
 # Plot search time comparison
 plt.figure(figsize=(10, 6))
@@ -48,6 +112,7 @@ plt.title("Total Execution Time by Experiment")
 plt.xticks(rotation=45, ha="right")
 plt.tight_layout()
 plt.savefig(os.path.join(report_dir, "time_comparison.png"))
+plt.close()
 
 # Plot plan length (only for successful experiments)
 successful = summary[summary["Success"] == True]
@@ -58,9 +123,13 @@ if not successful.empty:
     plt.xticks(rotation=45, ha="right")
     plt.tight_layout()
     plt.savefig(os.path.join(report_dir, "plan_length_comparison.png"))
+    plt.close()
 
 # Analyze detailed experiment results
 experiment_details = []
+
+# One figure is reused for all progress line plots, cleared between plots
+progress_fig, progress_ax = plt.subplots(figsize=(12, 6))
 for exp_name in summary["Experiment"]:
     exp_dir = os.path.join(latest_run, exp_name.replace(" ", "_"))
     metadata_file = os.path.join(exp_dir, "metadata.json")
@@ -80,51 +149,47 @@ for exp_name in summary["Experiment"]:
         progress_df = pd.DataFrame(progress_data)
         
         # Plot flights progress
-        plt.figure(figsize=(12, 6))
-        plt.plot(progress_df["iteration"], progress_df["flights"], marker='o', linestyle='-', markersize=2)
-        plt.title(f"{exp_name}: Flights Processed Over Iterations")
-        plt.xlabel("Iterations")
-        plt.ylabel("Flights Processed")
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(os.path.join(report_dir, f"{exp_name.replace(' ', '_')}_flights_progress.png"))
+        progress_ax.clear()
+        progress_ax.plot(progress_df["iteration"], progress_df["flights"], marker='o', linestyle='-', markersize=2)
+        progress_ax.set_title(f"{exp_name}: Flights Processed Over Iterations")
+        progress_ax.set_xlabel("Iterations")
+        progress_ax.set_ylabel("Flights Processed")
+        progress_ax.grid(True)
+        progress_fig.tight_layout()
+        progress_fig.savefig(os.path.join(report_dir, f"{exp_name.replace(' ', '_')}_flights_progress.png"))
         
         # Plot parts progress
-        plt.figure(figsize=(12, 6))
-        plt.plot(progress_df["iteration"], progress_df["parts"], marker='o', linestyle='-', markersize=2)
-        plt.title(f"{exp_name}: Parts Produced Over Iterations")
-        plt.xlabel("Iterations")
-        plt.ylabel("Parts Produced")
-        plt.grid(True)
-        plt.tight_layout()
-        plt.savefig(os.path.join(report_dir, f"{exp_name.replace(' ', '_')}_parts_progress.png"))
+        progress_ax.clear()
+        progress_ax.plot(progress_df["iteration"], progress_df["parts"], marker='o', linestyle='-', markersize=2)
+        progress_ax.set_title(f"{exp_name}: Parts Produced Over Iterations")
+        progress_ax.set_xlabel("Iterations")
+        progress_ax.set_ylabel("Parts Produced")
+        progress_ax.grid(True)
+        progress_fig.tight_layout()
+        progress_fig.savefig(os.path.join(report_dir, f"{exp_name.replace(' ', '_')}_parts_progress.png"))
         
         # Combined progress heatmap
         if len(progress_df) > 0:
             # Create a 2D histogram
-            flight_bins = np.arange(0, 7)  # 0-6 flights
-            part_bins = np.arange(0, 14)   # 0-13 parts
-            
-            hist, xedges, yedges = np.histogram2d(
-                progress_df["flights"], 
-                progress_df["parts"], 
-                bins=[flight_bins, part_bins]
-            )
+            hist = progress_histogram(progress_df["flights"].to_numpy(), progress_df["parts"].to_numpy())
             
             # Plot heatmap
             plt.figure(figsize=(10, 8))
             plt.imshow(hist.T, origin='lower', aspect='auto', 
-                    extent=[xedges[0], xedges[-1], yedges[0], yedges[-1]],
+                    extent=[FLIGHT_BINS[0], FLIGHT_BINS[-1], PART_BINS[0], PART_BINS[-1]],
                     cmap='viridis')
             plt.colorbar(label='Frequency')
             plt.title(f"{exp_name}: State Space Exploration")
             plt.xlabel("Flights Processed")
             plt.ylabel("Parts Produced")
-            plt.xticks(np.arange(0, 7))
-            plt.yticks(np.arange(0, 14))
+            plt.xticks(FLIGHT_BINS)
+            plt.yticks(PART_BINS)
             plt.grid(True, linestyle='--', alpha=0.7)
             plt.tight_layout()
             plt.savefig(os.path.join(report_dir, f"{exp_name.replace(' ', '_')}_state_heatmap.png"))
+            plt.close()
+
+plt.close(progress_fig)
 
 # Create detailed analysis report
 report_file = os.path.join(report_dir, "improved_analysis_report.txt")
@@ -142,25 +207,13 @@ with open(report_file, "w") as f:
     
     # Compare heuristics
     f.write("Heuristic Comparison:\n")
-    heuristic_comparison = summary.groupby("Heuristic").agg({
-        "Success": "mean",
-        "Iterations": "mean",
-        "SearchTime": "mean",
-        "TotalTime": "mean",
-        "PlanLength": lambda x: x[x > 0].mean() if any(x > 0) else 0
-    })
+    heuristic_comparison = compare_by(summary, "Heuristic")
     f.write(heuristic_comparison.to_string())
     f.write("\n\n")
     
     # Compare action prioritization
     f.write("Action Prioritization Comparison:\n")
-    prioritize_comparison = summary.groupby("Prioritize").agg({
-        "Success": "mean",
-        "Iterations": "mean",
-        "SearchTime": "mean",
-        "TotalTime": "mean",
-        "PlanLength": lambda x: x[x > 0].mean() if any(x > 0) else 0
-    })
+    prioritize_comparison = compare_by(summary, "Prioritize")
     f.write(prioritize_comparison.to_string())
     f.write("\n\n")
     
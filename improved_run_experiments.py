@@ -1,9 +1,12 @@
-import subprocess
+import contextlib
 import time
 import os
 import json
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
+from run_beluga_solver import run_solver
+
 # Define improved experiment configurations
 improved_experiments = [
     {
@@ -32,22 +35,17 @@ improved_experiments = [
 # Define the instance file to use
 instance_file = "problem_4_s46_j23_r2_oc51_f6.json"
 
-# Create results directory
-results_dir = "improved_experiment_results"
-os.makedirs(results_dir, exist_ok=True)
-
-# Create a timestamp for this experiment run
-timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-run_dir = os.path.join(results_dir, f"run_{timestamp}")
-os.makedirs(run_dir, exist_ok=True)
-
-# Create a summary file
-summary_file = os.path.join(run_dir, "summary.csv")
-with open(summary_file, "w") as f:
-    f.write("Experiment,Heuristic,Prioritize,Iterations,Success,PlanLength,SearchTime,TotalTime\n")
-
-# Run each experiment
-for exp in improved_experiments:
+def run_experiment(exp, run_dir):
+    """
+    Run one experiment with the solver and save its results.
+    
+    Args:
+        exp: Experiment configuration
+        run_dir: Directory of this experiment run
+    
+    Returns:
+        The experiment's line for the summary file
+    """
     print(f"\n\n{'='*80}")
     print(f"Running improved experiment: {exp['name']}")
     print(f"{'='*80}\n")
@@ -56,74 +54,17 @@ for exp in improved_experiments:
     exp_dir = os.path.join(run_dir, exp['name'].replace(" ", "_"))
     os.makedirs(exp_dir, exist_ok=True)
     
-    # Create command
-    cmd = [
-        "python", "run_beluga_solver.py",
-        instance_file,
-        "--max-iterations", str(exp["max_iterations"]),
-        "--time-limit", str(exp["time_limit"]),
-        "--heuristic", exp["heuristic"],
-        "--output", os.path.join(exp_dir, "plan.txt")
-    ]
-    
-    if exp["prioritize_actions"]:
-        cmd.append("--prioritize-actions")
-    
-    # Log file
+    # Run the experiment; the solver output goes to the log file, since
+    # experiments run concurrently
     log_file = os.path.join(exp_dir, "log.txt")
-    
-    # Run the experiment
     start_time = time.time()
-    with open(log_file, "w") as f:
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
-        
-        # Stream output to both console and file
-        for line in process.stdout:
-            print(line, end="")
-            f.write(line)
-    
-    process.wait()
+    with open(log_file, "w") as f, contextlib.redirect_stdout(f):
+        result = run_solver(instance_file, max_iterations=exp["max_iterations"], time_limit=exp["time_limit"],
+                            heuristic=exp["heuristic"], prioritize_actions=exp["prioritize_actions"],
+                            output=os.path.join(exp_dir, "plan.txt"))
     total_time = time.time() - start_time
     
-    # Extract results
-    success = False
-    iterations = exp["max_iterations"]  # Default if not found
-    plan_length = 0
-    search_time = 0.0
-    
-    with open(log_file, "r") as f:
-        log_content = f.read()
-        if "Goal reached after" in log_content:
-            success = True
-            # Extract iterations
-            for line in log_content.split("\n"):
-                if "Goal reached after" in line:
-                    iterations = int(line.split("Goal reached after")[1].split(" iterations")[0].strip())
-                if "Plan length:" in line:
-                    plan_length = int(line.split("Plan length:")[1].strip())
-                if "A* search completed in" in line:
-                    search_time = float(line.split("A* search completed in")[1].split(" seconds")[0].strip())
-    
-    # Track progress differently - extract max flight and part progress
-    max_flights = 0
-    max_parts = 0
-    for line in log_content.split("\n"):
-        if "Flights:" in line and "Parts:" in line:
-            try:
-                flights_str = line.split("Flights:")[1].split(",")[0].strip()
-                flights = int(flights_str.split("/")[0])
-                
-                parts_str = line.split("Parts:")[1].strip()
-                parts = int(parts_str.split("/")[0])
-                
-                max_flights = max(max_flights, flights)
-                max_parts = max(max_parts, parts)
-            except:
-                pass
-    
-    # Write results to summary
-    with open(summary_file, "a") as f:
-        f.write(f"{exp['name']},{exp['heuristic']},{exp['prioritize_actions']},{iterations},{success},{plan_length},{search_time},{total_time}\n")
+    print(f"Experiment '{exp['name']}' completed in {total_time:.2f} seconds")
     
     # Save experiment metadata
     with open(os.path.join(exp_dir, "metadata.json"), "w") as f:
@@ -133,41 +74,48 @@ for exp in improved_experiments:
             "prioritize_actions": exp["prioritize_actions"],
             "max_iterations": exp["max_iterations"],
             "time_limit": exp["time_limit"],
-            "success": success,
-            "iterations": iterations,
-            "plan_length": plan_length,
-            "search_time": search_time,
+            "success": result["success"],
+            "iterations": result["iterations"],
+            "plan_length": result["plan_length"],
+            "search_time": result["search_time"],
             "total_time": total_time,
-            "max_flights_reached": max_flights,
-            "max_parts_produced": max_parts
+            "max_flights_reached": result["max_flights_reached"],
+            "max_parts_produced": result["max_parts_produced"]
         }, f, indent=2)
-
-    # Track progress over time
-    progress_data = []
-    current_iteration = 0
-    for line in log_content.split("\n"):
-        if "Iteration" in line and "Flights:" in line and "Parts:" in line:
-            try:
-                iteration_str = line.split("Iteration")[1].split(":")[0].strip()
-                current_iteration = int(iteration_str)
-                
-                flights_str = line.split("Flights:")[1].split(",")[0].strip()
-                flights = int(flights_str.split("/")[0])
-                
-                parts_str = line.split("Parts:")[1].strip()
-                parts = int(parts_str.split("/")[0])
-                
-                progress_data.append({
-                    "iteration": current_iteration,
-                    "flights": flights,
-                    "parts": parts
-                })
-            except:
-                pass
     
     # Save progress data
     with open(os.path.join(exp_dir, "progress_data.json"), "w") as f:
-        json.dump(progress_data, f, indent=2)
+        json.dump(result["progress"], f, indent=2)
+    
+    return f"{exp['name']},{exp['heuristic']},{exp['prioritize_actions']},{result['iterations']},{result['success']},{result['plan_length']},{result['search_time']},{total_time}\n"
+
+def main():
+    # Create results directory
+    results_dir = "improved_experiment_results"
+    os.makedirs(results_dir, exist_ok=True)
+    
+    # Create a timestamp for this experiment run
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    run_dir = os.path.join(results_dir, f"run_{timestamp}")
+    os.makedirs(run_dir, exist_ok=True)
+    
+    # Create a summary file
+    summary_file = os.path.join(run_dir, "summary.csv")
+    with open(summary_file, "w") as f:
+        f.write("Experiment,Heuristic,Prioritize,Iterations,Success,PlanLength,SearchTime,TotalTime\n")
+    
+    # Run the experiments concurrently, one worker process per experiment
+    max_workers = min(len(improved_experiments), os.cpu_count() or 1)
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        summary_lines = list(executor.map(run_experiment, improved_experiments,
+                                          [run_dir] * len(improved_experiments)))
+    
+    # Write results to summary, in experiment order
+    with open(summary_file, "a") as f:
+        f.writelines(summary_lines)
+    
+    print("\n\nAll improved experiments completed!")
+    print(f"Results available in: {run_dir}")
 
-print("\n\nAll improved experiments completed!")
-print(f"Results available in: {run_dir}")
\ No newline at end of file
+if __name__ == "__main__":
+    main()
\ No newline at end of file
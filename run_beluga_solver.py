@@ -6,45 +6,37 @@ from beluga_loader import load_instance
 from beluga_state import create_initial_state
 from beluga_astar import astar_search
 from beluga_verification import simulate_plan
-from beluga_utils import print_plan, print_state
+from beluga_utils import print_plan, print_state, action_to_string
 from beluga_goal import detailed_goal_check
 from beluga_debug import run_debug_session
 
 def save_plan_to_file(plan, instance_data, filename):
     """Save the plan to a file in a readable format."""
-    from beluga_utils import action_to_string
-    
     with open(filename, 'w') as f:
         f.write(f"Plan with {len(plan)} steps:\n")
-        for i, action in enumerate(plan):
-            f.write(f"Step {i+1}: {action_to_string(action)}\n")
+        f.writelines(f"Step {i+1}: {action_to_string(action)}\n" for i, action in enumerate(plan))
 
-def main():
-    parser = argparse.ArgumentParser(description='Beluga Solver using A* Search')
-    parser.add_argument('instance_file', help='Path to the instance JSON file')
-    parser.add_argument('--max-iterations', type=int, default=10000, help='Maximum iterations for A* search')
-    parser.add_argument('--time-limit', type=int, default=60, help='Time limit in seconds for A* search')
-    parser.add_argument('--debug', action='store_true', help='Run in debug mode')
-    parser.add_argument('--output', help='Output file to save the plan')
-    parser.add_argument('--heuristic', choices=['standard', 'weighted', 'production_focus'], 
-                      default='standard', help='Heuristic variant to use')
-    parser.add_argument('--prioritize-actions', action='store_true', 
-                      help='Prioritize goal-relevant actions')
-    args = parser.parse_args()
+def run_solver(instance_file, max_iterations=10000, time_limit=60, heuristic="standard",
+               prioritize_actions=False, output=None):
+    """
+    Solve an instance with A* search and verify the plan found.
     
-    # Check if file exists
-    if not os.path.exists(args.instance_file):
-        print(f"Error: Instance file '{args.instance_file}' not found!")
-        return
-    
-    # Run in debug mode if requested
-    if args.debug:
-        run_debug_session(args.instance_file)
-        return
+    Args:
+        instance_file: Path to the instance JSON file
+        max_iterations: Maximum iterations for A* search
+        time_limit: Time limit in seconds for A* search
+        heuristic: Heuristic variant to use (standard, weighted, production_focus)
+        prioritize_actions: Whether to prioritize goal-relevant actions
+        output: Optional file to save the plan to
     
+    Returns:
+        Dict with the outcome of the search (success, iterations, plan_length,
+        search_time, max_flights_reached, max_parts_produced) and its
+        progress samples
+    """
     # Load instance
     start_time = time.time()
-    instance_data = load_instance(args.instance_file)
+    instance_data = load_instance(instance_file)
     print(f"Instance loaded in {time.time() - start_time:.2f} seconds")
     
     # Create initial state
@@ -52,25 +44,40 @@ def main():
     print("Initial state created")
     
     # Run A* search
-    print(f"Running A* search with heuristic '{args.heuristic}' (max iterations: {args.max_iterations}, time limit: {args.time_limit}s)...")
+    print(f"Running A* search with heuristic '{heuristic}' (max iterations: {max_iterations}, time limit: {time_limit}s)...")
+    stats = {}
     start_time = time.time()
-    plan = astar_search(initial_state, instance_data, max_iterations=args.max_iterations, 
-                       time_limit=args.time_limit, heuristic_variant=args.heuristic, 
-                       prioritize_actions=args.prioritize_actions)
+    plan = astar_search(initial_state, instance_data, max_iterations=max_iterations, 
+                       time_limit=time_limit, heuristic_variant=heuristic, 
+                       prioritize_actions=prioritize_actions, stats=stats)
     search_time = time.time() - start_time
     print(f"A* search completed in {search_time:.2f} seconds")
     
+    # A plan is only returned once the goal is reached; unsolved runs report
+    # the iteration budget and no search time, as the experiment summaries
+    # always have, and the progress reached comes from the search's samples
+    progress = stats.get('progress', [])
+    result = {
+        "success": plan is not None,
+        "iterations": stats['iterations'] if plan is not None else max_iterations,
+        "plan_length": len(plan) if plan else 0,
+        "search_time": search_time if plan is not None else 0.0,
+        "max_flights_reached": max((sample["flights"] for sample in progress), default=0),
+        "max_parts_produced": max((sample["parts"] for sample in progress), default=0),
+        "progress": progress
+    }
+    
     # Print and save plan
     if plan:
         print_plan(plan, instance_data)
         print(f"Plan length: {len(plan)}")
         
-        if args.output:
-            save_plan_to_file(plan, instance_data, args.output)
-            print(f"Plan saved to {args.output}")
+        if output:
+            save_plan_to_file(plan, instance_data, output)
+            print(f"Plan saved to {output}")
     else:
         print("No plan found!")
-        return
+        return result
     
     # Verify plan
     print("\nVerifying plan...")
@@ -99,6 +106,34 @@ def main():
         print(f"  Parts produced: {goal_check['production_status']['produced_parts']}/{goal_check['production_status']['total_parts']}")
         print(f"  Incoming jigs unloaded: {goal_check['flight_status']['incoming_processed']}/{goal_check['flight_status']['incoming_total']}")
         print(f"  Outgoing jigs loaded: {goal_check['flight_status']['outgoing_processed']}/{goal_check['flight_status']['outgoing_total']}")
+    
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description='Beluga Solver using A* Search')
+    parser.add_argument('instance_file', help='Path to the instance JSON file')
+    parser.add_argument('--max-iterations', type=int, default=10000, help='Maximum iterations for A* search')
+    parser.add_argument('--time-limit', type=int, default=60, help='Time limit in seconds for A* search')
+    parser.add_argument('--debug', action='store_true', help='Run in debug mode')
+    parser.add_argument('--output', help='Output file to save the plan')
+    parser.add_argument('--heuristic', choices=['standard', 'weighted', 'production_focus'], 
+                      default='standard', help='Heuristic variant to use')
+    parser.add_argument('--prioritize-actions', action='store_true', 
+                      help='Prioritize goal-relevant actions')
+    args = parser.parse_args()
+    
+    # Check if file exists
+    if not os.path.exists(args.instance_file):
+        print(f"Error: Instance file '{args.instance_file}' not found!")
+        return
+    
+    # Run in debug mode if requested
+    if args.debug:
+        run_debug_session(args.instance_file)
+        return
+    
+    run_solver(args.instance_file, max_iterations=args.max_iterations, time_limit=args.time_limit,
+               heuristic=args.heuristic, prioritize_actions=args.prioritize_actions, output=args.output)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -2,108 +2,202 @@
 Script to run experiments with the hybrid A* + CSP approach.
 """
 
+import argparse
+import cProfile
+import csv
 import subprocess
 import time
 import os
+import sys
 import json
+import logging
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
+from itertools import product
 
 from beluga_loader import load_instance
 from beluga_state import create_initial_state
 from beluga_hybrid_solver import hybrid_astar_search
 from beluga_verification import simulate_plan
-from beluga_utils import print_plan, print_state
+from beluga_utils import print_state, action_to_string
 from beluga_goal import detailed_goal_check
 
-# Define experiment configurations
+# Every configuration is run once with each of these seeds, so differences
+# between configurations are not confounded with the random seed
+EXPERIMENT_SEEDS = (0, 1, 2)
+
+# Define experiment configurations: a grid over the weighted A* weight,
+# forward checking and random restarts, repeated for each seed
 hybrid_experiments = [
     {
-        "name": "Hybrid_A_with_Forward_Checking",
+        "name": (f"Hybrid_A_{'with' if use_forward_checking else 'without'}_Forward_Checking"
+                 f"_{'with' if use_random_restarts else 'without'}_Random_Restarts_w{weight}_s{seed}"),
         "heuristic": "weighted",
+        "weight": weight,
         "prioritize_actions": True,
-        "use_forward_checking": True,
-        "use_random_restarts": False,
+        "use_forward_checking": use_forward_checking,
+        "use_random_restarts": use_random_restarts,
+        "seed": seed,
         "max_iterations": 20000,
         "time_limit": 240  # 4 minutes
-    },
-    {
-        "name": "Hybrid_A_with_Random_Restarts",
-        "heuristic": "weighted",
-        "prioritize_actions": True,
-        "use_forward_checking": False,
-        "use_random_restarts": True,
-        "max_iterations": 20000,
-        "time_limit": 240
-    },
-    {
-        "name": "Full_Hybrid_A",
-        "heuristic": "weighted",
-        "prioritize_actions": True,
-        "use_forward_checking": True,
-        "use_random_restarts": True,
-        "max_iterations": 20000,
-        "time_limit": 240
     }
+    for weight, use_forward_checking, use_random_restarts, seed
+    in product((1.0, 1.5, 2.0), (True, False), (True, False), EXPERIMENT_SEEDS)
 ]
 
+# Settings used for any field an experiment loaded with --configs leaves out
+EXPERIMENT_DEFAULTS = {
+    "heuristic": "weighted",
+    "weight": 1.0,
+    "prioritize_actions": True,
+    "use_forward_checking": True,
+    "use_random_restarts": True,
+    "seed": 0,
+    "max_iterations": 20000,
+    "time_limit": 240
+}
+
+# The solver is pure Python, so under PyPy's JIT the same time limit covers
+# several times more iterations; the iteration budgets are raised to match
+PYPY_ITERATION_SCALE = 3
+
+# Set BELUGA_PROFILE=1 to profile each search; the profile is saved as
+# profile.pstats in the experiment directory and the peak traced memory is
+# recorded in its metadata
+PROFILE = os.environ.get("BELUGA_PROFILE") == "1"
+
+# Log records are prefixed with the experiment name, since experiments run
+# concurrently and share the console
+LOG_FORMAT = "%(name)s %(message)s"
+
+def configure_logging():
+    """Send experiment log records to the console; run in every worker process."""
+    logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+
+logger = logging.getLogger("hybrid_experiments")
+
+# Instance and initial state shared by the experiments of a worker process;
+# they are set once per worker by init_worker instead of being sent with
+# every experiment
+worker_instance_data = None
+worker_initial_state = None
+
+def init_worker(instance_data, initial_state):
+    """Set up a worker process: configure logging and keep the loaded instance."""
+    global worker_instance_data, worker_initial_state
+    configure_logging()
+    worker_instance_data = instance_data
+    worker_initial_state = initial_state
+
 # Define the instance file to use
 instance_file = "problem_4_s46_j23_r2_oc51_f6.json"
 
 def save_plan_to_file(plan, instance_data, filename):
     """Save the plan to a file in a readable format."""
-    from beluga_utils import action_to_string
-    
     with open(filename, 'w') as f:
         f.write(f"Plan with {len(plan)} steps:\n")
-        for i, action in enumerate(plan):
-            f.write(f"Step {i+1}: {action_to_string(action)}\n")
+        f.writelines(f"Step {i+1}: {action_to_string(action)}\n" for i, action in enumerate(plan))
 
-def run_experiment(exp, instance_file, results_dir):
-    """Run a single experiment and return results."""
-    print(f"\n\n{'='*80}")
-    print(f"Running hybrid experiment: {exp['name']}")
-    print(f"{'='*80}\n")
+def experiment_result(metadata):
+    """Return the summary results of an experiment from its metadata."""
+    return {
+        "name": metadata["name"],
+        "success": metadata["success"],
+        "iterations": metadata["max_iterations"] if not metadata["success"] else metadata["plan_length"],
+        "plan_length": metadata["plan_length"],
+        "search_time": metadata["search_time"],
+        "total_time": metadata["total_time"],
+        "max_flights_reached": metadata["max_flights_reached"],
+        "max_parts_produced": metadata["max_parts_produced"]
+    }
+
+def run_experiment(exp, results_dir, resume=False):
+    """
+    Run a single experiment on the worker's loaded instance and return results.
+    
+    With resume, an experiment that already saved its metadata in
+    results_dir with the same configuration is not run again; its saved
+    results are returned instead.
+    """
+    instance_data = worker_instance_data
+    initial_state = worker_initial_state
+    log = logging.getLogger(exp['name'])
+    log.info("=" * 80)
+    log.info(f"Running hybrid experiment: {exp['name']}")
+    log.info("=" * 80)
     
-    # Create output directory for this experiment
+    # Create output directory for this experiment, and name its files once
     exp_dir = os.path.join(results_dir, exp['name'].replace(" ", "_"))
     os.makedirs(exp_dir, exist_ok=True)
+    metadata_file = os.path.join(exp_dir, "metadata.json")
+    console_log_file = os.path.join(exp_dir, "console.log")
+    profile_file = os.path.join(exp_dir, "profile.pstats")
+    log_file = os.path.join(exp_dir, "log.txt")
+    events_file = os.path.join(exp_dir, "events.jsonl")
+    plan_file = os.path.join(exp_dir, "plan.txt")
     
-    # Load instance
-    start_time = time.time()
-    instance_data = load_instance(instance_file)
-    print(f"Instance loaded in {time.time() - start_time:.2f} seconds")
+    # Reuse the results of a completed run of this configuration
+    if resume and os.path.exists(metadata_file):
+        with open(metadata_file, "r") as f:
+            metadata = json.load(f)
+        if all(metadata.get(key) == value for key, value in exp.items()):
+            log.info(f"Experiment already completed, reusing results from {metadata_file}")
+            return experiment_result(metadata)
     
-    # Create initial state
-    initial_state = create_initial_state(instance_data)
-    print("Initial state created")
+    # Also keep this experiment's log records in its directory
+    log_handler = logging.FileHandler(console_log_file, mode="w")
+    log_handler.setFormatter(logging.Formatter(LOG_FORMAT))
+    log.addHandler(log_handler)
+    
+    start_time = time.perf_counter()
     
     # Run the hybrid A* search
-    print(f"Running hybrid A* search with heuristic '{exp['heuristic']}' " + 
+    log.info(f"Running hybrid A* search with heuristic '{exp['heuristic']}' " + 
           f"(max iterations: {exp['max_iterations']}, time limit: {exp['time_limit']}s)...")
     
-    search_start_time = time.time()
-    plan = hybrid_astar_search(
-        initial_state, instance_data, 
-        max_iterations=exp["max_iterations"],
-        time_limit=exp["time_limit"],
-        heuristic_variant=exp["heuristic"],
-        prioritize_actions=exp["prioritize_actions"],
-        use_forward_checking=exp["use_forward_checking"],
-        use_random_restarts=exp["use_random_restarts"]
-    )
-    search_time = time.time() - search_start_time
-    total_time = time.time() - start_time
-    
-    print(f"Hybrid A* search completed in {search_time:.2f} seconds")
+    if PROFILE:
+        profiler = cProfile.Profile()
+        tracemalloc.start()
+        profiler.enable()
+    
+    # The search reports its progress as JSON lines while it runs
+    stats = {}
+    with open(events_file, "w") as events:
+        search_start_time = time.perf_counter()
+        plan = hybrid_astar_search(
+            initial_state, instance_data, 
+            max_iterations=exp["max_iterations"],
+            time_limit=exp["time_limit"],
+            heuristic_variant=exp["heuristic"],
+            prioritize_actions=exp["prioritize_actions"],
+            use_forward_checking=exp["use_forward_checking"],
+            use_random_restarts=exp["use_random_restarts"],
+            stats=stats,
+            heuristic_weight=exp["weight"],
+            event_sink=lambda event: events.write(json.dumps(event) + "\n"),
+            seed=exp["seed"]
+        )
+        search_time = time.perf_counter() - search_start_time
+    total_time = time.perf_counter() - start_time
+    
+    if PROFILE:
+        profiler.disable()
+        _, peak_memory = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        profiler.dump_stats(profile_file)
+    
+    log.info(f"Hybrid A* search completed in {search_time:.2f} seconds")
     
     # Log file
-    log_file = os.path.join(exp_dir, "log.txt")
     with open(log_file, "w") as f:
         f.write(f"Experiment: {exp['name']}\n")
         f.write(f"Heuristic: {exp['heuristic']}\n")
+        f.write(f"Heuristic Weight: {exp['weight']}\n")
         f.write(f"Prioritize Actions: {exp['prioritize_actions']}\n")
         f.write(f"Forward Checking: {exp['use_forward_checking']}\n")
         f.write(f"Random Restarts: {exp['use_random_restarts']}\n")
+        f.write(f"Seed: {exp['seed']}\n")
         f.write(f"Max Iterations: {exp['max_iterations']}\n")
         f.write(f"Time Limit: {exp['time_limit']} seconds\n\n")
         
@@ -112,77 +206,58 @@ def run_experiment(exp, instance_file, results_dir):
         
         if plan:
             f.write(f"Found plan with {len(plan)} steps.\n")
-            for i, action in enumerate(plan):
-                from beluga_utils import action_to_string
-                f.write(f"Step {i+1}: {action_to_string(action)}\n")
+            f.writelines(f"Step {i+1}: {action_to_string(action)}\n" for i, action in enumerate(plan))
         else:
             f.write("No plan found.\n")
     
-    # Print and save plan
+    # Log and save plan
     success = False
     max_flights_reached = 0
     max_parts_produced = 0
     plan_length = 0
     
     if plan:
-        print_plan(plan, instance_data)
+        log.info(f"Plan with {len(plan)} steps:")
+        for i, action in enumerate(plan):
+            log.info(f"Step {i+1}: {action_to_string(action)}")
         plan_length = len(plan)
-        print(f"Plan length: {plan_length}")
+        log.info(f"Plan length: {plan_length}")
         
         # Save plan to file
-        plan_file = os.path.join(exp_dir, "plan.txt")
         save_plan_to_file(plan, instance_data, plan_file)
-        print(f"Plan saved to {plan_file}")
+        log.info(f"Plan saved to {plan_file}")
         
         # Verify plan
-        print("\nVerifying plan...")
+        log.info("Verifying plan...")
         success, final_state, failed_action = simulate_plan(initial_state, plan, instance_data)
         
         if success:
-            print("\nPlan verification successful!")
-            
-            # Perform detailed goal check
-            goal_check = detailed_goal_check(final_state, instance_data)
-            max_flights_reached = goal_check['current_flight']
-            max_parts_produced = goal_check['production_status']['produced_parts']
+            log.info("Plan verification successful!")
         else:
-            print("\nPlan verification failed!")
+            log.info("Plan verification failed!")
             if failed_action:
-                print(f"Failed at action: {failed_action}")
-            
-            # Check current progress
-            goal_check = detailed_goal_check(final_state, instance_data)
-            max_flights_reached = goal_check['current_flight']
-            max_parts_produced = goal_check['production_status']['produced_parts']
+                log.info(f"Failed at action: {failed_action}")
+        
+        # Progress reached by the plan, whether or not it reaches the goal
+        goal_check = detailed_goal_check(final_state, instance_data)
+        max_flights_reached = goal_check['current_flight']
+        max_parts_produced = goal_check['production_status']['produced_parts']
     else:
-        print("No plan found!")
+        log.info("No plan found!")
         
-        # Estimate progress from the log file
-        with open(log_file, "r") as f:
-            log_content = f.read()
-            
-            # Find maximum flights and parts reached from the log
-            for line in log_content.split("\n"):
-                if "Flights:" in line and "Parts:" in line:
-                    try:
-                        flights_str = line.split("Flights:")[1].split(",")[0].strip()
-                        flights = int(flights_str.split("/")[0])
-                        
-                        parts_str = line.split("Parts:")[1].strip()
-                        parts = int(parts_str.split("/")[0])
-                        
-                        max_flights_reached = max(max_flights_reached, flights)
-                        max_parts_produced = max(max_parts_produced, parts)
-                    except:
-                        pass
+        # Use the best progress the search reported
+        max_flights_reached = stats['best_progress']['flights']
+        max_parts_produced = stats['best_progress']['parts']
     
     # Save experiment metadata
     metadata = {
         "name": exp["name"],
         "heuristic": exp["heuristic"],
+        "weight": exp["weight"],
         "prioritize_actions": exp["prioritize_actions"],
         "use_forward_checking": exp["use_forward_checking"],
         "use_random_restarts": exp["use_random_restarts"],
+        "seed": exp["seed"],
         "max_iterations": exp["max_iterations"],
         "time_limit": exp["time_limit"],
         "success": success,
@@ -190,50 +265,100 @@ def run_experiment(exp, instance_file, results_dir):
         "search_time": search_time,
         "total_time": total_time,
         "max_flights_reached": max_flights_reached,
-        "max_parts_produced": max_parts_produced
+        "max_parts_produced": max_parts_produced,
+        "runtime": sys.implementation.name
     }
+    if PROFILE:
+        metadata["peak_memory_bytes"] = peak_memory
     
-    with open(os.path.join(exp_dir, "metadata.json"), "w") as f:
+    with open(metadata_file, "w") as f:
         json.dump(metadata, f, indent=2)
     
-    return {
-        "name": exp["name"],
-        "success": success,
-        "iterations": exp["max_iterations"] if not success else plan_length,
-        "plan_length": plan_length,
-        "search_time": search_time,
-        "total_time": total_time,
-        "max_flights_reached": max_flights_reached,
-        "max_parts_produced": max_parts_produced
-    }
+    log.removeHandler(log_handler)
+    log_handler.close()
+    
+    return experiment_result(metadata)
+
+def load_experiments(configs_file):
+    """
+    Load experiment configurations from a JSON file.
+    
+    The file holds a list of experiment dicts; each needs a name, and any
+    other field it leaves out is taken from EXPERIMENT_DEFAULTS.
+    """
+    with open(configs_file, "r") as f:
+        configs = json.load(f)
+    return [{**EXPERIMENT_DEFAULTS, **config} for config in configs]
 
 def main():
-    # Create results directory
-    results_dir = "hybrid_experiment_results"
-    os.makedirs(results_dir, exist_ok=True)
+    parser = argparse.ArgumentParser(description='Run the hybrid A* + CSP experiments')
+    parser.add_argument('--instance', default=instance_file, help='Path to the instance JSON file')
+    parser.add_argument('--configs', help='JSON file with the list of experiment configurations to run')
+    parser.add_argument('--workers', type=int, help='Number of worker processes (default: one per experiment, up to the CPU count)')
+    parser.add_argument('--results-dir', default='hybrid_experiment_results', help='Directory for new experiment runs')
+    parser.add_argument('--resume', metavar='RUN_DIR',
+                        help='Resume an interrupted run in RUN_DIR, skipping completed experiments')
+    args = parser.parse_args()
     
-    # Create a timestamp for this experiment run
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_dir = os.path.join(results_dir, f"run_{timestamp}")
-    os.makedirs(run_dir, exist_ok=True)
+    configure_logging()
     
-    # Create a summary file
+    experiments = load_experiments(args.configs) if args.configs else hybrid_experiments
+    
+    runtime = sys.implementation.name
+    logger.info(f"Running on {runtime} {sys.version.split()[0]}")
+    if runtime == "pypy":
+        experiments = [{**exp, "max_iterations": exp["max_iterations"] * PYPY_ITERATION_SCALE}
+                       for exp in experiments]
+    
+    if args.resume:
+        run_dir = args.resume
+        if not os.path.isdir(run_dir):
+            logger.error(f"Error: Run directory '{run_dir}' not found!")
+            return
+    else:
+        # Create a timestamped directory for this experiment run, along
+        # with the results directory if needed
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_dir = os.path.join(args.results_dir, f"run_{timestamp}")
+        os.makedirs(run_dir, exist_ok=True)
+    
+    # Load instance once; every experiment starts from the same state
+    start_time = time.perf_counter()
+    instance_data = load_instance(args.instance)
+    logger.info(f"Instance loaded in {time.perf_counter() - start_time:.2f} seconds")
+    
+    # Create initial state
+    initial_state = create_initial_state(instance_data)
+    logger.info("Initial state created")
+    
+    # Create a summary file; it stays open while the experiments run and
+    # gets one row per experiment once they are all done
     summary_file = os.path.join(run_dir, "summary.csv")
-    with open(summary_file, "w") as f:
-        f.write("Experiment,Heuristic,Prioritize,ForwardChecking,RandomRestarts,Success,Iterations,PlanLength,SearchTime,TotalTime,MaxFlights,MaxParts\n")
-    
-    # Run each experiment
-    results = []
-    for exp in hybrid_experiments:
-        result = run_experiment(exp, instance_file, run_dir)
-        results.append(result)
+    with open(summary_file, "w", newline="") as f:
+        writer = csv.writer(f, lineterminator="\n")
+        writer.writerow(["Experiment", "Heuristic", "Weight", "Prioritize", "ForwardChecking", "RandomRestarts", "Seed", "Success",
+                         "Iterations", "PlanLength", "SearchTime", "TotalTime", "MaxFlights", "MaxParts"])
+        f.flush()
+        
+        # Run the experiments concurrently; they are independent CPU-bound
+        # searches, so each gets its own worker process, which receives the
+        # instance once when it starts
+        max_workers = args.workers or min(len(experiments), os.cpu_count() or 1)
+        with ProcessPoolExecutor(max_workers=max_workers, initializer=init_worker,
+                                 initargs=(instance_data, initial_state)) as executor:
+            results = list(executor.map(run_experiment, experiments,
+                                        [run_dir] * len(experiments),
+                                        [args.resume is not None] * len(experiments)))
         
-        # Update summary file
-        with open(summary_file, "a") as f:
-            f.write(f"{exp['name']},{exp['heuristic']},{exp['prioritize_actions']},{exp['use_forward_checking']},{exp['use_random_restarts']},{result['success']},{result['iterations']},{result['plan_length']},{result['search_time']},{result['total_time']},{result['max_flights_reached']},{result['max_parts_produced']}\n")
+        # Write results to summary, in experiment order
+        for exp, result in zip(experiments, results):
+            writer.writerow([exp['name'], exp['heuristic'], exp['weight'], exp['prioritize_actions'], exp['use_forward_checking'],
+                             exp['use_random_restarts'], exp['seed'], result['success'], result['iterations'], result['plan_length'],
+                             result['search_time'], result['total_time'], result['max_flights_reached'],
+                             result['max_parts_produced']])
     
-    print("\n\nAll hybrid experiments completed!")
-    print(f"Results available in: {run_dir}")
+    logger.info("All hybrid experiments completed!")
+    logger.info(f"Results available in: {run_dir}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,30 @@
+from beluga_hybrid_solver import BucketPriorityQueue
+
+def test_fifo_within_priority():
+    """Test that items of equal priority come out in insertion order."""
+    print("Testing BucketPriorityQueue ordering...")
+    queue = BucketPriorityQueue()
+    items = [("a", 2), ("b", 1), ("c", 2), ("d", 1), ("e", 3), ("f", 2), ("g", 1)]
+    for item, priority in items:
+        queue.put(item, priority)
+    
+    # Lowest priority first, then insertion order within a priority
+    expected = [item for item, _ in sorted(items, key=lambda entry: entry[1])]
+    popped = []
+    while not queue.is_empty():
+        popped.append(queue.get())
+    print(f"  Popped: {', '.join(popped)}")
+    assert popped == expected, f"expected {expected}, got {popped}"
+    
+    # A bucket that was emptied and refilled keeps FIFO order too
+    queue.put("h", 1)
+    queue.put("i", 0)
+    queue.put("j", 1)
+    popped = [queue.get(), queue.get(), queue.get()]
+    print(f"  Popped after refill: {', '.join(popped)}")
+    assert popped == ["i", "h", "j"], f"expected ['i', 'h', 'j'], got {popped}"
+    assert queue.is_empty()
+
+if __name__ == "__main__":
+    test_fifo_within_priority()
+    print("\nAll tests completed!")
\ No newline at end of file
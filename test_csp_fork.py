@@ -0,0 +1,36 @@
+import json
+import os
+import random
+from beluga_state import create_initial_state
+from beluga_astar import get_all_possible_actions
+from beluga_csp import BelugaCSP
+
+INSTANCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "problem_instances", "problem_4_s46_j23_r2_oc51_f6.json")
+
+def test_fork_matches_fresh_csp(steps=60, seed=0):
+    """Test that a forked CSP matches a CSP built from scratch along a random walk."""
+    print("Testing BelugaCSP.fork...")
+    with open(INSTANCE_FILE, "r") as f:
+        instance_data = json.load(f)
+    rng = random.Random(seed)
+    
+    state = create_initial_state(instance_data)
+    csp = BelugaCSP(state, instance_data)
+    for step in range(steps):
+        actions = list(get_all_possible_actions(state, instance_data))
+        if not actions:
+            break
+        state = state.get_next_state(rng.choice(actions), instance_data, validated=True)
+        
+        forked = BelugaCSP.fork(csp, state)
+        fresh = BelugaCSP(state, instance_data)
+        assert forked.reduce_domains() == fresh.reduce_domains(), f"reduce_domains differs at step {step}"
+        assert forked.domains == fresh.domains, f"domains differ at step {step}"
+        csp = forked
+    
+    print(f"  Forked CSP matched the fresh CSP for {step + 1} steps")
+
+if __name__ == "__main__":
+    test_fork_matches_fresh_csp()
+    print("\nAll tests completed!")
\ No newline at end of file
@@ -0,0 +1,36 @@
+import json
+import os
+import random
+from beluga_state import create_initial_state
+from beluga_local_search import BelugaLocalSearch
+
+INSTANCE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             "problem_instances", "problem_4_s46_j23_r2_oc51_f6.json")
+
+def test_upper_bound_covers_successors(steps=200, seed=0):
+    """Test that a state's upper bound is at least the score of its sampled successors."""
+    print("Testing BelugaLocalSearch._upper_bound...")
+    with open(INSTANCE_FILE, "r") as f:
+        instance_data = json.load(f)
+    rng = random.Random(seed)
+    local_search = BelugaLocalSearch(instance_data, seed=seed)
+    
+    state = create_initial_state(instance_data)
+    checked = 0
+    for step in range(steps):
+        bound = local_search._upper_bound(state, instance_data)
+        successors = [local_search._expand(state, action, instance_data)
+                      for action in local_search._get_random_actions(state, instance_data)]
+        if not successors:
+            break
+        for next_state in successors:
+            score = local_search._evaluate_state(next_state, instance_data)
+            assert bound >= score, f"bound {bound} below successor score {score} at step {step}"
+            checked += 1
+        state = rng.choice(successors)
+    
+    print(f"  Upper bound held for {checked} sampled successors over {step + 1} steps")
+
+if __name__ == "__main__":
+    test_upper_bound_covers_successors()
+    print("\nAll tests completed!")
\ No newline at end of file